@@ -4,11 +4,16 @@ from openai import OpenAI
 import wikipedia
 import requests
 import urllib3
-from engine import generate_radio_show_from_script
+from script_gen import WIKI_SENTENCES, assemble_script, fetch_wikipedia_summary, generate_dialogue
+from render_jobs import get_job_queue, job_secrets, QUEUED, RUNNING, DONE, FAILED, FINISHED_STATES
 from pathlib import Path
 from dotenv import load_dotenv
-from show_history import add_show, get_all_shows, delete_show, get_show, clear_history
+from show_history import add_show, count_shows, get_shows_page, search_shows, delete_show, get_show, clear_history
+from engine import save_upload
+from retention import get_retention_manager
+from audio_server import audio_url
 import shutil
+import uuid
 
 # Load environment variables from .env file
 load_dotenv()
@@ -206,6 +211,10 @@ if "current_script" not in st.session_state:
     st.session_state.current_script = None
 if "current_topic" not in st.session_state:
     st.session_state.current_topic = None
+if "script_variant" not in st.session_state:
+    st.session_state.script_variant = 0  # Which cached take of the current topic's script is shown
+if "render_key" not in st.session_state:
+    st.session_state.render_key = None  # Lets re-renders of an edited script reuse unchanged lines
 if "pause_duration" not in st.session_state:
     st.session_state.pause_duration = 800  # milliseconds
 if "bg_music_volume" not in st.session_state:
@@ -214,6 +223,18 @@ if "custom_bg_music" not in st.session_state:
     st.session_state.custom_bg_music = None
 if "show_history_view" not in st.session_state:
     st.session_state.show_history_view = False
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
+if "open_show_id" not in st.session_state:
+    st.session_state.open_show_id = None  # The one library show whose audio is loaded
+if "render_job_id" not in st.session_state:
+    # A reconnecting session picks its render job back up from the URL
+    st.session_state.render_job_id = st.query_params.get("job")
+    restored_job = get_job_queue().get(st.session_state.render_job_id) if st.session_state.render_job_id else None
+    if restored_job and not st.session_state.current_script:
+        st.session_state.current_script = restored_job["script"]
+        st.session_state.current_topic = restored_job["topic"]
+        st.session_state.render_key = restored_job["options"].get("render_key")
 
 # ===============================
 # UI HEADER
@@ -227,38 +248,89 @@ st.markdown("---")
 # ===============================
 # SHOW HISTORY / LIBRARY SECTION
 # ===============================
+# Shows listed per page in the library
+HISTORY_PAGE_SIZE = 10
+
+def served_audio_url(audio_file, download_name=None):
+    """Audio server URL for a file, or None to fall back to Streamlit's media handling."""
+    return audio_url(audio_file, host=st.context.headers.get("Host"), download_name=download_name)
+
+def render_library_show(show):
+    """One library entry; its audio is only embedded once the user opens it."""
+    is_open = show["id"] == st.session_state.open_show_id
+    with st.expander(f"🎙️ {show.get('topic', 'Untitled')} - {show.get('created_at', '')[:10]}", expanded=is_open):
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            st.markdown(f"**Topic:** {show.get('topic', 'N/A')}")
+            st.markdown(f"**Created:** {show.get('created_at', 'N/A')}")
+            if show.get("snippet"):
+                st.caption(show["snippet"])
+            
+            # Audio is only embedded for the show the user opened
+            if is_open:
+                audio_file = show.get('audio_file')
+                if audio_file and Path(audio_file).exists():
+                    st.audio(served_audio_url(audio_file) or audio_file, format="audio/mp3")
+                else:
+                    st.warning("⚠️ Audio file not found")
+            elif st.button("🎧 Load Show", key=f"open_{show.get('id')}"):
+                st.session_state.open_show_id = show["id"]
+                st.rerun()
+        
+        with col2:
+            if st.button("🗑️ Delete", key=f"delete_{show.get('id')}"):
+                delete_show(show.get('id'))
+                st.rerun()
+            
+            if st.button("📝 View Script", key=f"script_{show.get('id')}"):
+                full_show = get_show(show["id"]) or {}
+                st.text_area("Script", value=full_show.get('script', ''), height=200, key=f"script_view_{show.get('id')}")
+
 if st.session_state.show_history_view:
     st.markdown("### 📚 Show History & Library")
     
-    shows = get_all_shows()
-    
-    if shows:
-        st.info(f"📊 You have {len(shows)} saved show(s)")
+    search_query = st.text_input(
+        "🔍 Search shows",
+        placeholder='Search topics and scripts, e.g. cricket or "masala chai"',
+        key="library_search"
+    )
+    total_shows = count_shows()
+    
+    if search_query.strip():
+        results = search_shows(search_query)
+        st.info(f"🔍 {len(results)} show(s) matching \"{search_query.strip()}\"")
+        for show in results:
+            render_library_show(show)
+    elif total_shows:
+        st.info(f"📊 You have {total_shows} saved show(s)")
+        
+        page_count = (total_shows + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        page = min(st.session_state.history_page, page_count - 1)
+        # Only this page's rows are read, and without their scripts
+        shows = get_shows_page(offset=page * HISTORY_PAGE_SIZE, limit=HISTORY_PAGE_SIZE)
         
         for show in shows:
-            with st.expander(f"🎙️ {show.get('topic', 'Untitled')} - {show.get('created_at', '')[:10]}"):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.markdown(f"**Topic:** {show.get('topic', 'N/A')}")
-                    st.markdown(f"**Created:** {show.get('created_at', 'N/A')}")
-                    
-                    audio_file = show.get('audio_file')
-                    if audio_file and Path(audio_file).exists():
-                        st.audio(audio_file, format="audio/mp3")
-                    else:
-                        st.warning("⚠️ Audio file not found")
-                
-                with col2:
-                    if st.button("🗑️ Delete", key=f"delete_{show.get('id')}"):
-                        delete_show(show.get('id'))
-                        st.rerun()
-                    
-                    if st.button("📝 View Script", key=f"script_{show.get('id')}"):
-                        st.text_area("Script", value=show.get('script', ''), height=200, key=f"script_view_{show.get('id')}")
+            render_library_show(show)
+        
+        if page_count > 1:
+            prev_col, page_col, next_col = st.columns([1, 2, 1])
+            with prev_col:
+                if st.button("← Newer", disabled=page == 0, use_container_width=True):
+                    st.session_state.history_page = page - 1
+                    st.session_state.open_show_id = None
+                    st.rerun()
+            with page_col:
+                st.markdown(f"<p style='text-align: center;'>Page {page + 1} of {page_count}</p>", unsafe_allow_html=True)
+            with next_col:
+                if st.button("Older →", disabled=page >= page_count - 1, use_container_width=True):
+                    st.session_state.history_page = page + 1
+                    st.session_state.open_show_id = None
+                    st.rerun()
         
         if st.button("🗑️ Clear All History"):
             clear_history()
+            st.session_state.history_page = 0
             st.rerun()
     else:
         st.info("📭 No shows in history yet. Generate your first show to see it here!")
@@ -297,83 +369,22 @@ with st.container():
 # ===============================
 # SCRIPT GENERATION
 # ===============================
-def fetch_wikipedia_summary(topic_name, sentences=20):
-    """Fetch Wikipedia summary with SSL error handling."""
-    try:
-        # Try normal request first
-        return wikipedia.summary(topic_name, sentences=sentences)
-    except Exception as e:
-        if "SSL" in str(e) or "CERTIFICATE" in str(e) or "certificate verify failed" in str(e):
-            # If SSL error, try with SSL verification disabled
-            import wikipedia.wikipedia as wiki_module
-            # Temporarily disable SSL verification
-            original_get = requests.get
-            def patched_get(*args, **kwargs):
-                kwargs['verify'] = False
-                return original_get(*args, **kwargs)
-            requests.get = patched_get
-            try:
-                result = wikipedia.summary(topic_name, sentences=sentences)
-                return result
-            finally:
-                requests.get = original_get
-        else:
-            raise
-
-def generate_script(topic_name):
+def generate_script(topic_name, variant=0):
+    """Write a script for a topic; higher variants give alternative takes (cached ones first)."""
     try:
         with st.spinner("🔍 Fetching Wikipedia content..."):
-            wiki = fetch_wikipedia_summary(topic_name, sentences=20)
+            wiki = fetch_wikipedia_summary(topic_name, sentences=WIKI_SENTENCES)
         
         with st.spinner("✍️ Writing radio conversation..."):
-            # Fixed Intro
-            intro = """Anjli: Hello dosto, welcome to Radio AI! Main hu Anjli.
-Hitesh: Aur main hu Hitesh. Aaj Radio AI par hum baat karenge ek kaafi interesting topic ke baare mein.
-Anjli: Ha yaar, toh bina time waste kiye chalo shuru karte hain aaj ka discussion."""
-
-            # Fixed Outro
-            outro = """Anjli: Toh dosto, umeed hai aaj ka discussion aapko pasand aaya hoga.
-Hitesh: Agar pasand aaya ho toh Radio AI ke saath jude rahiye, aur aise hi interesting topics ke liye.
-Anjli: Main hu Anjli,
-Hitesh: Aur main hu Hitesh,
-Anjli: Milte hain next episode mein, tab tak ke liye bye bye!"""
-
-            prompt = f"""
-You are a professional Indian FM RJ.
-
-STRICT RULES:
-- EXACTLY 30 lines
-- 15 lines start with Anjli:
-- 15 lines start with Hitesh:
-- CRITICAL: Dialogue MUST alternate in sequence - Start with Anjli, then Hitesh, then Anjli, then Hitesh, and so on
-- The sequence must be: Anjli, Hitesh, Anjli, Hitesh, Anjli, Hitesh... (alternating pattern)
-- Hinglish, casual RJ tone
-- Always use station name "Radio AI"
-- Never use "Radio XYZ"
-- Only dialogue
-- Make it sound like a natural conversation between two hosts
-- NOTE: Intro and Outro will be added automatically, so generate ONLY the main conversation content
-
-Topic:
-{wiki}
-
-Output ONLY the main dialogue in alternating sequence (Anjli, Hitesh, Anjli, Hitesh...). Do NOT include intro or outro.
-"""
-
-            client = get_openai_client()
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.8
-            )
-
-            main_script = response.choices[0].message.content.strip()
+            main_script = generate_dialogue(get_openai_client(), wiki, variant=variant)
             
             # Combine intro + main script + outro
-            full_script = f"{intro}\n\n{main_script}\n\n{outro}"
+            full_script = assemble_script(main_script)
             
             st.session_state.current_script = full_script
             st.session_state.current_topic = topic_name
+            st.session_state.script_variant = variant
+            st.session_state.render_key = uuid.uuid4().hex
             return full_script
     except wikipedia.exceptions.DisambiguationError as e:
         st.error(f"❌ Multiple topics found. Please be more specific. Options: {', '.join(e.options[:5])}")
@@ -456,7 +467,7 @@ if st.session_state.current_script:
     
     if regen_btn:
         if st.session_state.current_topic:
-            script = generate_script(st.session_state.current_topic)
+            script = generate_script(st.session_state.current_topic, variant=st.session_state.script_variant + 1)
             if script:
                 st.rerun()
         else:
@@ -469,109 +480,125 @@ if st.session_state.current_script:
         if not script_text.strip():
             st.error("❌ Script is empty. Please enter a valid script.")
         else:
-            st.markdown("---")
-            st.markdown("### 🎵 Step 3: Generating Audio")
-            
-            progress_container = st.container()
-            with progress_container:
-                # Status card
-                with st.container():
-                    st.markdown("""
-                    <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                                padding: 1.5rem; border-radius: 15px; color: white; margin-bottom: 1rem;'>
-                        <h4 style='color: white; margin: 0;'>🎙️ Generating Audio...</h4>
-                        <p style='color: rgba(255,255,255,0.9); margin: 0.5rem 0 0 0;'>Please wait while we create your radio show</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                def progress_callback(msg):
-                    status_text.text(msg)
-                    # Simple progress update
-                    if "Voice" in msg:
-                        try:
-                            # Extract number from "Voice X/Y"
-                            parts = msg.split("/")
-                            if len(parts) > 1:
-                                current = int(parts[0].split()[-1])
-                                total = int(parts[1])
-                                progress_bar.progress(current / total)
-                        except:
-                            pass
-                
-                try:
-                    # Determine background music path
-                    bg_music_path = None
-                    if st.session_state.custom_bg_music:
-                        bg_music_path = st.session_state.custom_bg_music
-                    
-                    audio_file = generate_radio_show_from_script(
-                        script_text,
-                        progress_callback,
-                        elevenlabs_api_key=st.session_state.elevenlabs_api_key,
-                        pause_duration_ms=st.session_state.pause_duration,
-                        bg_music_volume_db=st.session_state.bg_music_volume,
-                        bg_music_path=bg_music_path
-                    )
-                    
-                    progress_bar.progress(1.0)
-                    status_text.markdown("""
-                    <div style='background: #d4edda; padding: 1rem; border-radius: 10px; 
-                                border-left: 4px solid #28a745; margin-top: 1rem;'>
-                        <strong>✅ Radio show complete!</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown("---")
-                    st.markdown("### 🎉 Your Radio Show is Ready!")
-                    
-                    # Success message with styling
-                    st.markdown("""
-                    <div style='background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); 
-                                padding: 2rem; border-radius: 15px; color: white; text-align: center; margin: 1rem 0;'>
-                        <h3 style='color: white; margin: 0 0 1rem 0;'>✨ Audio Generated Successfully!</h3>
-                        <p style='color: rgba(255,255,255,0.95); margin: 0;'>Listen to your radio show below</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Audio player in a styled container
-                    st.markdown("#### 🎧 Listen to Your Radio Show")
-                    st.audio(audio_file, format="audio/mp3")
-                    
-                    # Download button with better styling
-                    st.markdown("#### 📥 Download")
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        with open(audio_file, "rb") as f:
-                            st.download_button(
-                                label="⬇️ Download Radio Show (MP3)",
-                                data=f.read(),
-                                file_name=f"radio_show_{st.session_state.current_topic.replace(' ', '_') if st.session_state.current_topic else 'show'}.mp3",
-                                mime="audio/mp3",
-                                use_container_width=True,
-                                type="primary"
-                            )
-                    
-                    with col2:
-                        if st.button("💾 Save to History", use_container_width=True):
-                            show_entry = add_show(
-                                topic=st.session_state.current_topic or "Untitled",
-                                script=script_text,
-                                audio_file=audio_file,
-                                metadata={
-                                    "pause_duration": st.session_state.pause_duration,
-                                    "bg_music_volume": st.session_state.bg_music_volume
-                                }
-                            )
-                            st.success(f"✅ Show saved to history! (ID: {show_entry['id']})")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error generating audio: {str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
+            job = get_job_queue().submit(
+                script_text,
+                topic=st.session_state.current_topic,
+                options={
+                    "pause_duration_ms": st.session_state.pause_duration,
+                    "bg_music_volume_db": st.session_state.bg_music_volume,
+                    "bg_music_path": st.session_state.custom_bg_music,
+                    "render_key": st.session_state.render_key
+                },
+                secrets=job_secrets(st.session_state.elevenlabs_api_key)
+            )
+            st.session_state.render_job_id = job["id"]
+            # Keep the job in the URL so a reconnected or reloaded tab finds it again
+            st.query_params["job"] = job["id"]
+
+# ===============================
+# RENDER JOB STATUS
+# ===============================
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id):
+    """Poll a queued or running job until it finishes, then rerun the page."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return
+    if job["status"] in FINISHED_STATES:
+        st.rerun()
+
+    if job["status"] == QUEUED:
+        position = get_job_queue().position(job_id)
+        st.markdown(f"<span class='status-badge status-waiting'>⏳ Queued (#{position or 1} in line)</span>", unsafe_allow_html=True)
+        if st.button("✖️ Cancel Render", key=f"cancel_{job_id}"):
+            get_job_queue().cancel(job_id)
+            st.rerun()
+    else:
+        st.markdown("<span class='status-badge status-generating'>🎙️ Generating Audio...</span>", unsafe_allow_html=True)
+    st.progress(job["progress"])
+    st.text(job["message"])
+
+def render_job_result(job):
+    """Show a finished job's audio, download and save buttons."""
+    # Once saved, the job's result points at the library copy of the audio
+    saved_show_id = job["result"].get("show_id")
+    audio_file = job["result"]["audio_file"]
+    if not Path(audio_file).exists():
+        st.warning("⚠️ Audio file not found")
+        return
+
+    st.markdown("### 🎉 Your Radio Show is Ready!")
+    
+    # Success message with styling
+    st.markdown("""
+    <div style='background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); 
+                padding: 2rem; border-radius: 15px; color: white; text-align: center; margin: 1rem 0;'>
+        <h3 style='color: white; margin: 0 0 1rem 0;'>✨ Audio Generated Successfully!</h3>
+        <p style='color: rgba(255,255,255,0.95); margin: 0;'>Listen to your radio show below</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Audio player in a styled container
+    # Streamed from disk by the audio server, so the MP3 never sits in session memory
+    download_name = f"radio_show_{job['topic'].replace(' ', '_') if job['topic'] else 'show'}.mp3"
+    st.markdown("#### 🎧 Listen to Your Radio Show")
+    st.audio(served_audio_url(audio_file) or audio_file, format="audio/mp3")
+    
+    # Download button with better styling
+    st.markdown("#### 📥 Download")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        download_url = served_audio_url(audio_file, download_name=download_name)
+        if download_url:
+            st.link_button(
+                "⬇️ Download Radio Show (MP3)",
+                download_url,
+                use_container_width=True,
+                type="primary"
+            )
+        else:
+            with open(audio_file, "rb") as f:
+                st.download_button(
+                    label="⬇️ Download Radio Show (MP3)",
+                    data=f.read(),
+                    file_name=download_name,
+                    mime="audio/mp3",
+                    use_container_width=True,
+                    type="primary"
+                )
+    
+    with col2:
+        if saved_show_id:
+            st.success(f"✅ Saved to history (ID: {saved_show_id})")
+        elif st.button("💾 Save to History", use_container_width=True):
+            show_entry = add_show(
+                topic=job["topic"] or "Untitled",
+                script=job["script"],
+                audio_file=audio_file,
+                metadata={
+                    "pause_duration": job["options"].get("pause_duration_ms"),
+                    "bg_music_volume": job["options"].get("bg_music_volume_db"),
+                    "render_job": job["id"],
+                    "render_metrics": job["result"].get("metrics")
+                }
+            )
+            get_job_queue().mark_saved(job["id"], show_entry)
+            st.rerun()
+
+if st.session_state.render_job_id:
+    job = get_job_queue().get(st.session_state.render_job_id)
+    if job:
+        st.markdown("---")
+        st.markdown("### 🎵 Step 3: Generating Audio")
+        if job["status"] in (QUEUED, RUNNING):
+            render_job_progress(job["id"])
+        elif job["status"] == DONE:
+            render_job_result(job)
+        elif job["status"] == FAILED:
+            st.error(f"❌ Error generating audio: {job['error']}")
+        else:
+            st.info("✖️ Render cancelled")
 
 # ===============================
 # SIDEBAR INFO
@@ -603,22 +630,17 @@ with st.sidebar:
     )
     
     if uploaded_music is not None:
-        # Save uploaded file temporarily
-        custom_music_path = Path(__file__).parent / "custom_bg_music.mp3"
-        with open(custom_music_path, "wb") as f:
-            f.write(uploaded_music.getbuffer())
+        # Saved under Audios/uploads by content; the retention manager removes it once unused
+        custom_music_path = save_upload(bytes(uploaded_music.getbuffer()), Path(uploaded_music.name).suffix)
         st.session_state.custom_bg_music = str(custom_music_path)
         st.success(f"✅ Custom music uploaded: {uploaded_music.name}")
         
         if st.button("🗑️ Remove Custom Music"):
-            if custom_music_path.exists():
-                custom_music_path.unlink()
             st.session_state.custom_bg_music = None
             st.rerun()
     elif st.session_state.custom_bg_music and Path(st.session_state.custom_bg_music).exists():
         st.info(f"🎵 Using custom music: {Path(st.session_state.custom_bg_music).name}")
         if st.button("🗑️ Remove Custom Music"):
-            Path(st.session_state.custom_bg_music).unlink()
             st.session_state.custom_bg_music = None
             st.rerun()
     else:
@@ -700,8 +722,19 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
+    # Disk usage of generated audio (kept in budget by the retention manager)
+    storage = get_retention_manager().usage()
+    st.caption(
+        f"💽 Audio storage: {storage['bytes'] / (1024 * 1024):.1f} MB of "
+        f"{storage['max_bytes'] / (1024 * 1024):.0f} MB "
+        f"(library {storage['categories']['library']['bytes'] / (1024 * 1024):.1f} MB)"
+    )
+    
     if st.button("🔄 Clear Session"):
         st.session_state.current_script = None
         st.session_state.current_topic = None
+        st.session_state.render_key = None
+        st.session_state.render_job_id = None
+        st.query_params.clear()
         st.rerun()
 
@@ -0,0 +1,196 @@
+"""
+Audio Mixing
+Sample-level assembly of the show timeline and background music
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+# Samples mixed per step; bounds the temporary memory used by mix_background
+MIX_BLOCK_SAMPLES = 1 << 16
+
+# Memory budget for decoded background music shared by all renders
+BG_CACHE_MAX_BYTES = int(os.getenv("BG_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+_bg_cache = OrderedDict()  # (path, mtime, size, frame_rate) -> AudioSegment, oldest first
+_bg_cache_bytes = 0
+_bg_cache_lock = threading.Lock()
+
+_SAMPLE_TYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def assemble_timeline(
+    clips: List[AudioSegment],
+    pause_duration_ms: int = 0,
+    trailing_pause_ms: int = 0,
+) -> AudioSegment:
+    """Join clips with a pause between each pair, in time linear in the show length.
+
+    Adding AudioSegments pairwise copies the whole accumulated show on every
+    step. Instead, the output buffer is allocated once at its final size and
+    every clip's PCM is copied into place; the pauses are the untouched
+    zero bytes in between.
+
+    Args:
+        clips: Dialogue clips in script order
+        pause_duration_ms: Silence between consecutive clips in milliseconds
+        trailing_pause_ms: Silence appended after the last clip in milliseconds
+
+    Returns:
+        A single AudioSegment containing the whole timeline
+    """
+    if not clips:
+        raise ValueError("No clips to assemble")
+
+    # Bring every clip to one common format (no-op when they already match)
+    frame_rate = max(clip.frame_rate for clip in clips)
+    channels = max(clip.channels for clip in clips)
+    sample_width = max(clip.sample_width for clip in clips)
+    clips = [
+        clip.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+        for clip in clips
+    ]
+
+    frame_width = channels * sample_width
+    pause_bytes = int(frame_rate * pause_duration_ms / 1000) * frame_width
+    trailing_bytes = int(frame_rate * trailing_pause_ms / 1000) * frame_width
+    total_bytes = (
+        sum(len(clip.raw_data) for clip in clips)
+        + pause_bytes * (len(clips) - 1)
+        + trailing_bytes
+    )
+
+    buffer = bytearray(total_bytes)
+    view = memoryview(buffer)
+    offset = 0
+    for clip in clips:
+        data = clip.raw_data
+        view[offset:offset + len(data)] = data
+        offset += len(data) + pause_bytes
+
+    return AudioSegment(
+        data=buffer,
+        sample_width=sample_width,
+        frame_rate=frame_rate,
+        channels=channels
+    )
+
+
+def db_to_gain(db: float) -> float:
+    """Convert a volume change in dB to a linear amplitude factor."""
+    return 10 ** (db / 20)
+
+
+def to_samples(segment: AudioSegment) -> np.ndarray:
+    """Return a read-only view of a segment's interleaved PCM samples."""
+    return np.frombuffer(segment.raw_data, dtype=_SAMPLE_TYPES[segment.sample_width])
+
+
+def mix_samples(out: np.ndarray, background: np.ndarray, gain: float = 1.0, offset: int = 0):
+    """Add background, looped end to end, onto out in place.
+
+    The loop is done by index arithmetic over fixed-size blocks, so no
+    repeated copy of the background is ever built. Sums are clipped to the
+    sample range instead of wrapping around. out[0] lines up with sample
+    `offset` of the endlessly looped background.
+    """
+    if not len(background):
+        return
+    info = np.iinfo(out.dtype)
+    work_type = np.float32 if out.dtype.itemsize <= 2 else np.float64
+    total, loop_length = len(out), len(background)
+    pos = 0
+    while pos < total:
+        bg_pos = (offset + pos) % loop_length
+        length = min(MIX_BLOCK_SAMPLES, total - pos, loop_length - bg_pos)
+        mixed = out[pos:pos + length].astype(work_type)
+        mixed += background[bg_pos:bg_pos + length] * gain
+        np.clip(mixed, info.min, info.max, out=mixed)
+        out[pos:pos + length] = mixed
+        pos += length
+
+
+def mix_background(
+    dialogue: AudioSegment,
+    background: AudioSegment,
+    volume_db: float = 0,
+    start_frame: int = 0,
+) -> AudioSegment:
+    """Loop background music under the dialogue at volume_db.
+
+    Both inputs are brought to the richer of their two formats, as pydub's
+    overlay does, and the background is summed straight into the dialogue
+    buffer, so peak memory is about one copy of the show.
+
+    Args:
+        dialogue: The assembled dialogue timeline
+        background: Background music (looped if shorter than the dialogue)
+        volume_db: Gain applied to the background music in dB
+        start_frame: Position of the dialogue's first frame in the looped
+            music, for mixing a show piece by piece
+
+    Returns:
+        The mixed show, as long as the dialogue
+    """
+    frame_rate = max(dialogue.frame_rate, background.frame_rate)
+    channels = max(dialogue.channels, background.channels)
+    sample_width = max(dialogue.sample_width, background.sample_width)
+    dialogue = dialogue.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+    background = background.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+
+    data = dialogue.raw_data
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    out = np.frombuffer(data, dtype=_SAMPLE_TYPES[dialogue.sample_width])
+    mix_samples(out, to_samples(background), db_to_gain(volume_db), offset=start_frame * channels)
+    return dialogue._spawn(data)
+
+
+def load_background(path, frame_rate: Optional[int] = None) -> AudioSegment:
+    """Decode background music, reusing earlier decodes of the same file.
+
+    Decoded PCM is kept in a process-wide LRU keyed by (path, mtime, size,
+    frame_rate), so replacing the file on disk invalidates its entry.
+    Entries are evicted oldest first to stay within BG_CACHE_MAX_BYTES.
+
+    Args:
+        path: Background music file
+        frame_rate: Optional sample rate to resample to before caching
+    """
+    global _bg_cache_bytes
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size, frame_rate)
+
+    with _bg_cache_lock:
+        if key in _bg_cache:
+            _bg_cache.move_to_end(key)
+            return _bg_cache[key]
+
+    segment = AudioSegment.from_mp3(str(path))
+    if frame_rate:
+        segment = segment.set_frame_rate(frame_rate)
+
+    size = len(segment.raw_data)
+    if size <= BG_CACHE_MAX_BYTES:
+        with _bg_cache_lock:
+            if key not in _bg_cache:
+                _bg_cache[key] = segment
+                _bg_cache_bytes += size
+            while _bg_cache_bytes > BG_CACHE_MAX_BYTES:
+                _, evicted = _bg_cache.popitem(last=False)
+                _bg_cache_bytes -= len(evicted.raw_data)
+    return segment
+
+
+def clear_background_cache():
+    """Drop every cached background decode."""
+    global _bg_cache_bytes
+    with _bg_cache_lock:
+        _bg_cache.clear()
+        _bg_cache_bytes = 0
@@ -0,0 +1,260 @@
+"""
+Audio Server
+Small static HTTP server for show audio, with Range support
+
+The app's players and download links point here instead of handing whole
+MP3s to Streamlit, which would read every file into server memory and push
+it through the session's websocket. Files are streamed straight from disk
+with sendfile, and Range requests let players seek without downloading
+what comes before.
+"""
+import logging
+import mimetypes
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from engine import SHOWS_PATH
+from library_store import LIBRARY_PATH
+
+logger = logging.getLogger(__name__)
+
+# The server has no authentication, so by default only this machine can reach it.
+# Set AUDIO_SERVER_HOST=0.0.0.0 to serve other machines directly.
+AUDIO_SERVER_HOST = os.getenv("AUDIO_SERVER_HOST", "127.0.0.1")
+# Away from Streamlit's own ports (8501, then 8502, ... for extra instances)
+# and from fake_api_server.py's default 8765, which often runs alongside
+AUDIO_SERVER_PORT = int(os.getenv("AUDIO_SERVER_PORT", "8610"))
+# Public base URL of the server, e.g. https://radio.example.com/audio when a
+# reverse proxy forwards that path to AUDIO_SERVER_PORT. Needed whenever the
+# app is served over HTTPS: browsers block http:// audio on https:// pages.
+# Default: the host the app was opened on, at AUDIO_SERVER_PORT.
+AUDIO_SERVER_URL = os.getenv("AUDIO_SERVER_URL", "")
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1", "[::1]"}
+# URL prefix -> directory served under it
+AUDIO_ROOTS = {"library": LIBRARY_PATH, "shows": SHOWS_PATH}
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into an inclusive (start, end) byte range.
+
+    Returns None when the whole file should be sent: no header, a unit other
+    than bytes, or several ranges (which a server may answer in full).
+
+    Raises:
+        RangeNotSatisfiable: If the range starts past the end of the file
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("._") or "radio_show.mp3"
+
+
+class AudioServer:
+    """Serves files from a few directories over HTTP on a background thread.
+
+    Only regular files inside the configured roots are served; paths that
+    resolve outside them get a 404.
+
+    Args:
+        roots: URL prefix -> directory (default: the library and show outputs)
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+    """
+
+    def __init__(self, roots: Optional[Dict[str, Path]] = None, host: str = AUDIO_SERVER_HOST, port: int = AUDIO_SERVER_PORT):
+        self.roots = {name: Path(path) for name, path in (roots or AUDIO_ROOTS).items()}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self.host = host
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        """Serve on a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="audio-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def resolve(self, url_path: str) -> Optional[Path]:
+        """Map a request path to a file inside one of the roots, or None."""
+        name, _, rest = unquote(url_path).lstrip("/").partition("/")
+        root = self.roots.get(name)
+        if root is None or not rest:
+            return None
+        try:
+            path = (root / rest).resolve()
+            path.relative_to(root.resolve())
+        except (OSError, ValueError):
+            return None
+        return path if path.is_file() else None
+
+    def url_path(self, audio_file) -> Optional[str]:
+        """Request path for a file under one of the roots, or None if it isn't servable."""
+        try:
+            path = Path(audio_file).resolve()
+        except (OSError, TypeError):
+            return None
+        for name, root in self.roots.items():
+            try:
+                relative = path.relative_to(root.resolve())
+            except ValueError:
+                continue
+            return f"/{name}/{quote(relative.as_posix())}"
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class AudioHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _serve(self, send_body):
+                url = urlsplit(self.path)
+                path = server.resolve(url.path)
+                try:
+                    f = open(path, "rb") if path else None
+                except OSError:
+                    # Removed since it was resolved (e.g. by retention cleanup)
+                    f = None
+                if f is None:
+                    self.send_error(404)
+                    return
+                with f:
+                    stat = os.fstat(f.fileno())
+                    size = stat.st_size
+                    etag = f'"{size:x}-{int(stat.st_mtime):x}"'
+                    range_header = self.headers.get("Range")
+                    if_range = self.headers.get("If-Range")
+                    if if_range and if_range != etag:
+                        # The file changed since the client's partial copy; send it whole
+                        range_header = None
+                    try:
+                        byte_range = parse_range(range_header, size)
+                    except RangeNotSatisfiable:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+
+                    start, end = byte_range or (0, size - 1)
+                    length = end - start + 1 if size else 0
+                    self.send_response(206 if byte_range else 200)
+                    if byte_range:
+                        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                    self.send_header("Content-Type", mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+                    self.send_header("Content-Length", str(length))
+                    self.send_header("Accept-Ranges", "bytes")
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", self.date_time_string(int(stat.st_mtime)))
+                    # Library files are named by their content, so they never change
+                    immutable = url.path.startswith("/library/")
+                    self.send_header("Cache-Control", "public, max-age=31536000, immutable" if immutable else "no-cache")
+                    download = parse_qs(url.query).get("download")
+                    if download:
+                        self.send_header("Content-Disposition", f'attachment; filename="{_safe_filename(download[0])}"')
+                    self.end_headers()
+                    if send_body and length:
+                        try:
+                            # Zero-copy from the page cache where the OS supports it
+                            self.connection.sendfile(f, offset=start, count=length)
+                        except (BrokenPipeError, ConnectionResetError):
+                            # Players drop connections when the listener seeks
+                            self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return AudioHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+_server_failed = False
+
+
+def get_audio_server() -> Optional[AudioServer]:
+    """Process-wide audio server, started on first use.
+
+    Returns None if the port can't be bound (e.g. taken by another process),
+    in which case callers fall back to serving audio through Streamlit.
+    """
+    global _server, _server_failed
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = AudioServer().start()
+            except OSError as e:
+                logger.warning("Audio server unavailable on port %s: %s", AUDIO_SERVER_PORT, e)
+                _server_failed = True
+        return _server
+
+
+def audio_url(audio_file, host: Optional[str] = None, download_name: Optional[str] = None) -> Optional[str]:
+    """URL a browser can stream audio_file from, or None if it isn't served.
+
+    Without AUDIO_SERVER_URL, a server bound to the loopback interface is only
+    used for browsers on this machine; others get None and fall back.
+
+    Args:
+        audio_file: Path of a library or show output file
+        host: Host name the app was opened on (used unless AUDIO_SERVER_URL is set)
+        download_name: Ask the browser to save the file under this name
+    """
+    server = get_audio_server()
+    url_path = server.url_path(audio_file) if server else None
+    if url_path is None:
+        return None
+    if AUDIO_SERVER_URL:
+        base = AUDIO_SERVER_URL.rstrip("/")
+    else:
+        host = host or "localhost"
+        hostname = host if host.endswith("]") else host.rsplit(":", 1)[0]
+        if server.host in LOOPBACK_HOSTS and hostname not in LOOPBACK_HOSTS:
+            # A remote browser can't reach a loopback-only server
+            return None
+        base = f"http://{hostname}:{server.port}"
+    url = base + url_path
+    if download_name:
+        url += f"?download={quote(_safe_filename(download_name))}"
+    return url
@@ -0,0 +1,327 @@
+"""
+Batch Render
+Produces radio shows for a whole file of topics, end to end
+
+Usage:
+    python batch_render.py topics.txt --out-dir batch_week_42
+    python batch_render.py topics.txt --out-dir batch_week_42 --render-workers 3 --add-to-history
+    python batch_render.py topics.txt --prefetch-only
+    python batch_render.py topics.txt --stream
+
+The topics file has one Wikipedia topic per line (blank lines and lines
+starting with # are skipped). Each topic goes through Wikipedia fetch,
+script generation and rendering; topics run in parallel, with a separate
+concurrency limit per stage. Progress is checkpointed to
+<out-dir>/checkpoint.json after every stage, so re-running the same command
+resumes an interrupted batch, and a summary is written to
+<out-dir>/report.json.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from engine import generate_radio_show_from_lines, generate_radio_show_from_script, new_job_id
+from render_metrics import RenderMetrics
+from script_gen import (
+    SCRIPT_CACHE, WIKI_CACHE, assemble_script, fetch_wikipedia_summary, generate_dialogue, prefetch_wikipedia,
+    stream_script_lines
+)
+
+CHECKPOINT_NAME = "checkpoint.json"
+REPORT_NAME = "report.json"
+
+# Stages in pipeline order; each topic records the last one it finished
+STAGES = ("fetch", "script", "render")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def read_topics(path) -> List[str]:
+    """Read topics from a file, one per line, skipping blanks and # comments."""
+    topics = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                topics.append(line)
+    return topics
+
+
+def topic_slug(index: int, topic: str) -> str:
+    """File-safe, unique name for a topic's outputs."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", topic).strip("_").lower()[:60]
+    return f"{index:03d}_{slug or 'topic'}"
+
+
+class BatchCheckpoint:
+    """Thread-safe per-topic progress record, saved atomically after every change."""
+
+    def __init__(self, path: Path, topics: List[str]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        saved = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    saved = {entry["slug"]: entry for entry in json.load(f)["topics"]}
+            except (json.JSONDecodeError, IOError, KeyError):
+                saved = {}
+        self.entries = []
+        for i, topic in enumerate(topics):
+            slug = topic_slug(i, topic)
+            entry = saved.get(slug) or {
+                "slug": slug,
+                "topic": topic,
+                "stage": None,
+                "status": PENDING,
+                "wiki": None,
+                "script_file": None,
+                "audio_file": None,
+                "error": None,
+                "timings": {},
+                "render_metrics": None,
+            }
+            if entry["status"] == FAILED:
+                # Failed topics get another go on resume, from their last good stage
+                entry.update(status=PENDING, error=None)
+            self.entries.append(entry)
+        self.save()
+
+    def update(self, entry: Dict, **fields):
+        with self._lock:
+            entry.update(fields)
+            self._save_locked()
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": datetime.now().isoformat(), "topics": self.entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class BatchRunner:
+    """Runs every topic through fetch → script → render.
+
+    Topics run in parallel; each stage has its own limit on how many topics
+    may be in it at once, so e.g. many Wikipedia fetches can overlap with a
+    couple of TTS-heavy renders.
+
+    Args:
+        out_dir: Directory for scripts, audio, checkpoint and report
+        openai_client: OpenAI client for script generation
+        fetch_workers: Wikipedia fetches at once
+        script_workers: LLM calls at once
+        render_workers: Renders at once (each also runs its own TTS pool)
+        add_to_history: Also add finished shows to the app's show history
+        stream: Stream each script from the LLM straight into TTS, so writing
+            and synthesis overlap (script and render run as one stage)
+        log: Function called with progress messages
+    """
+
+    def __init__(
+        self,
+        out_dir,
+        openai_client=None,
+        fetch_workers: int = 4,
+        script_workers: int = 2,
+        render_workers: int = 2,
+        add_to_history: bool = False,
+        stream: bool = False,
+        log=print,
+    ):
+        self.out_dir = Path(out_dir)
+        self.openai_client = openai_client
+        self.limits = {
+            "fetch": threading.BoundedSemaphore(max(1, fetch_workers)),
+            "script": threading.BoundedSemaphore(max(1, script_workers)),
+            "render": threading.BoundedSemaphore(max(1, render_workers)),
+        }
+        self.max_parallel = max(1, fetch_workers, script_workers, render_workers)
+        self.add_to_history = add_to_history
+        self.stream = stream
+        self.log = log
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def run(self, topics: List[str]) -> Dict:
+        """Process every topic not already finished and return the summary report."""
+        checkpoint = BatchCheckpoint(self.out_dir / CHECKPOINT_NAME, topics)
+        todo = [entry for entry in checkpoint.entries if entry["status"] != DONE]
+        skipped = len(checkpoint.entries) - len(todo)
+        if skipped:
+            self.log(f"♻️ Resuming: {skipped} topic(s) already done")
+
+        started = time.perf_counter()
+        # Enough threads to keep every stage at its limit
+        workers = min(len(todo), self.max_parallel * len(STAGES)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda entry: self._run_topic(checkpoint, entry), todo))
+        wall_time = time.perf_counter() - started
+
+        report = self._report(checkpoint.entries, wall_time, skipped)
+        with open(self.out_dir / REPORT_NAME, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
+
+    def _stage(self, checkpoint: BatchCheckpoint, entry: Dict, stage: str, fn, limits=None):
+        """Run one stage under its concurrency limit(s), unless the checkpoint says it's done."""
+        if entry["stage"] is not None and STAGES.index(entry["stage"]) >= STAGES.index(stage):
+            return
+        with ExitStack() as held:
+            for name in limits or (stage,):
+                held.enter_context(self.limits[name])
+            started = time.perf_counter()
+            fields = fn()
+        timings = dict(entry["timings"], **{stage: round(time.perf_counter() - started, 3)})
+        checkpoint.update(entry, stage=stage, timings=timings, **fields)
+
+    def _run_topic(self, checkpoint: BatchCheckpoint, entry: Dict):
+        topic, slug = entry["topic"], entry["slug"]
+        try:
+            self._stage(checkpoint, entry, "fetch", lambda: {
+                "wiki": fetch_wikipedia_summary(topic)
+            })
+            if self.stream and entry["stage"] == "fetch":
+                # Script and render overlap, so the topic holds both stages' slots
+                self._stage(checkpoint, entry, "render", lambda: self._stream_render(entry), limits=("script", "render"))
+            self._stage(checkpoint, entry, "script", lambda: {
+                "script_file": self._write_script(slug, generate_dialogue(self.openai_client, entry["wiki"]))
+            })
+            self._stage(checkpoint, entry, "render", lambda: self._render(entry))
+        except Exception as e:
+            checkpoint.update(entry, status=FAILED, error=f"{type(e).__name__}: {e}")
+            self.log(f"❌ {topic}: {e}")
+            return
+        checkpoint.update(entry, status=DONE)
+        self.log(f"✅ {topic}")
+
+    def _write_script(self, slug: str, main_script: str) -> str:
+        path = self.out_dir / f"{slug}.txt"
+        path.write_text(assemble_script(main_script), encoding="utf-8")
+        return str(path)
+
+    def _render(self, entry: Dict) -> Dict:
+        script = Path(entry["script_file"]).read_text(encoding="utf-8")
+        metrics = RenderMetrics(entry["slug"])
+        audio_file = generate_radio_show_from_script(
+            script,
+            # Fresh workspace per run; the slug only names the outputs, and
+            # two batches over the same topics must not share clip directories
+            job_id=new_job_id(),
+            output_file=self.out_dir / f"{entry['slug']}.mp3",
+            metrics=metrics
+        )
+        return self._finish_render(entry, script, audio_file, metrics)
+
+    def _stream_render(self, entry: Dict) -> Dict:
+        metrics = RenderMetrics(entry["slug"])
+        audio_file, script = generate_radio_show_from_lines(
+            stream_script_lines(self.openai_client, entry["wiki"]),
+            job_id=new_job_id(),
+            output_file=self.out_dir / f"{entry['slug']}.mp3",
+            metrics=metrics
+        )
+        script_file = self.out_dir / f"{entry['slug']}.txt"
+        script_file.write_text(script, encoding="utf-8")
+        return dict(self._finish_render(entry, script, audio_file, metrics), script_file=str(script_file))
+
+    def _finish_render(self, entry: Dict, script: str, audio_file: str, metrics: RenderMetrics) -> Dict:
+        summary = metrics.summary()
+        if self.add_to_history:
+            from show_history import add_show
+            add_show(
+                topic=entry["topic"],
+                script=script,
+                audio_file=audio_file,
+                metadata={"batch": str(self.out_dir), "render_metrics": summary},
+                move_audio=False
+            )
+        return {"audio_file": audio_file, "render_metrics": summary}
+
+    def _report(self, entries: List[Dict], wall_time: float, skipped: int) -> Dict:
+        stage_totals = {}
+        for entry in entries:
+            for stage, seconds in entry["timings"].items():
+                stage_totals[stage] = round(stage_totals.get(stage, 0.0) + seconds, 3)
+        return {
+            "finished_at": datetime.now().isoformat(),
+            "topics": len(entries),
+            "succeeded": sum(1 for e in entries if e["status"] == DONE),
+            "failed": sum(1 for e in entries if e["status"] == FAILED),
+            "resumed_from_checkpoint": skipped,
+            "wall_time_s": round(wall_time, 3),
+            "stage_seconds": stage_totals,
+            "wiki_cache": WIKI_CACHE.stats(),
+            "script_cache": SCRIPT_CACHE.stats(),
+            "results": [
+                {
+                    "topic": e["topic"],
+                    "status": e["status"],
+                    "stage": e["stage"],
+                    "audio_file": e["audio_file"],
+                    "script_file": e["script_file"],
+                    "error": e["error"],
+                    "timings": e["timings"],
+                }
+                for e in entries
+            ],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render radio shows for every topic in a file")
+    parser.add_argument("topics_file", help="Text file with one Wikipedia topic per line")
+    parser.add_argument("--out-dir", default=None, help="Output directory (default: batch_<topics file name>)")
+    parser.add_argument("--fetch-workers", type=int, default=4, help="Wikipedia fetches at once")
+    parser.add_argument("--script-workers", type=int, default=2, help="Script generations (LLM calls) at once")
+    parser.add_argument("--render-workers", type=int, default=2, help="Audio renders at once")
+    parser.add_argument("--add-to-history", action="store_true", help="Add finished shows to the app's show history")
+    parser.add_argument("--prefetch-only", action="store_true", help="Only warm the Wikipedia cache for the topics")
+    parser.add_argument("--stream", action="store_true", help="Start TTS on each script line as the LLM writes it")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from openai import OpenAI
+
+    topics = read_topics(args.topics_file)
+    if args.prefetch_only:
+        results = prefetch_wikipedia(topics, max_workers=args.fetch_workers)
+        for topic, result in results.items():
+            print(f"  {'✅' if result == 'ok' else '❌'} {topic}" + ("" if result == "ok" else f": {result}"))
+        return
+
+    out_dir = args.out_dir or f"batch_{Path(args.topics_file).stem}"
+    runner = BatchRunner(
+        out_dir,
+        openai_client=OpenAI(),
+        fetch_workers=args.fetch_workers,
+        script_workers=args.script_workers,
+        render_workers=args.render_workers,
+        add_to_history=args.add_to_history,
+        stream=args.stream,
+    )
+    report = runner.run(topics)
+    print(f"\n{report['succeeded']}/{report['topics']} show(s) ready in {out_dir} "
+          f"({report['failed']} failed, {report['wall_time_s']}s)")
+    for result in report["results"]:
+        if result["status"] != DONE:
+            print(f"  ❌ {result['topic']} (after {result['stage'] or 'start'}): {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
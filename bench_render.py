@@ -0,0 +1,167 @@
+"""
+Render Benchmark
+Runs concurrent end-to-end renders against the fake API server
+
+Usage:
+    python bench_render.py --renders 20 --concurrency 4 --latency 0.3 --rate-429 0.05
+    python bench_render.py --server-url http://127.0.0.1:8765 --json bench.json
+
+Reports throughput, p50/p95/p99 render latency and peak RSS. Needs ffmpeg
+for the final MP3 export, like the app itself.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from engine import generate_radio_show_from_script
+from fake_api_server import fake_script, start_fake_server
+from render_metrics import peak_rss_mb
+from tts_cache import ClipCache
+from tts_client import ElevenLabsClient
+from tts_scheduler import TTSScheduler
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def run_benchmark(
+    base_url: str,
+    renders: int = 10,
+    concurrency: int = 2,
+    lines: int = 30,
+    max_workers: Optional[int] = None,
+    rate: float = 50.0,
+    unique_scripts: bool = True,
+    bg_music_path: Optional[str] = None,
+) -> Dict:
+    """Run `renders` full renders, `concurrency` at a time, and summarize them.
+
+    Args:
+        base_url: TTS API root (the fake server)
+        renders: Total number of renders
+        concurrency: Renders running at the same time
+        lines: Dialogue lines per script
+        max_workers: TTS requests in flight per render (default: engine default)
+        rate: Scheduler request rate limit (requests per second)
+        unique_scripts: Make every render's lines unique so the clip cache can't help
+        bg_music_path: Optional background music file to mix
+
+    Returns:
+        Summary dict with throughput, latency percentiles and peak RSS
+    """
+    client = ElevenLabsClient(api_key="fake", base_url=base_url, pool_size=max(10, concurrency * 4))
+    scheduler = TTSScheduler(rate=rate, max_concurrency=max(8, concurrency * 4))
+    # A throwaway cache, so benchmark clips never evict the app's real ones
+    cache_dir = tempfile.mkdtemp(prefix="radio_bench_cache_")
+    clip_cache = ClipCache(cache_dir)
+    output_dir = tempfile.mkdtemp(prefix="radio_bench_shows_")
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def render(n: int):
+        script = fake_script(lines)
+        if unique_scripts:
+            script = "\n".join(f"{line} (run {os.getpid()}-{n}-{time.time_ns()})" for line in script.split("\n"))
+        started = time.perf_counter()
+        try:
+            generate_radio_show_from_script(
+                script,
+                bg_music_path=bg_music_path,
+                max_workers=max_workers,
+                tts_client=client,
+                tts_scheduler=scheduler,
+                clip_cache=clip_cache,
+                output_file=os.path.join(output_dir, f"render_{n}.mp3")
+            )
+        except Exception as e:
+            with lock:
+                errors.append(f"render {n}: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(render, range(renders)))
+    wall_time = time.perf_counter() - started
+    client.close()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        "renders": renders,
+        "succeeded": len(latencies),
+        "failed": len(errors),
+        "errors": errors[:10],
+        "concurrency": concurrency,
+        "lines_per_render": lines,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_renders_per_min": round(len(latencies) / wall_time * 60, 2) if wall_time else 0.0,
+        "latency_p50_s": round(percentile(latencies, 50), 3),
+        "latency_p95_s": round(percentile(latencies, 95), 3),
+        "latency_p99_s": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "scheduler": scheduler.stats(),
+        "clip_cache": clip_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent radio show renders")
+    parser.add_argument("--renders", type=int, default=10, help="Total renders to run")
+    parser.add_argument("--concurrency", type=int, default=2, help="Renders running at once")
+    parser.add_argument("--lines", type=int, default=30, help="Dialogue lines per script")
+    parser.add_argument("--max-workers", type=int, default=None, help="TTS requests in flight per render")
+    parser.add_argument("--rate", type=float, default=50.0, help="TTS requests per second allowed")
+    parser.add_argument("--repeat-scripts", action="store_true", help="Reuse one script so the clip cache is exercised")
+    parser.add_argument("--bg-music", default=None, help="Background music file to mix")
+    parser.add_argument("--server-url", default=None, help="Use a running fake server instead of starting one")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server base latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Fake server latency jitter (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fake server 429 probability")
+    parser.add_argument("--json", default=None, help="Also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.server_url
+    if not base_url:
+        server, base_url = start_fake_server(
+            latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, retry_after=0.5
+        )
+
+    try:
+        summary = run_benchmark(
+            base_url,
+            renders=args.renders,
+            concurrency=args.concurrency,
+            lines=args.lines,
+            max_workers=args.max_workers,
+            rate=args.rate,
+            unique_scripts=not args.repeat_scripts,
+            bg_music_path=args.bg_music,
+        )
+    finally:
+        if server:
+            server.shutdown()
+
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
 
+import io
+import hashlib
 import os
-import requests
+import re
+import json
+import time
+import wave
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydub import AudioSegment
 from pathlib import Path
 from dotenv import load_dotenv
+from audio_mix import assemble_timeline, load_background, mix_background
+from tts_cache import ClipCache, clip_key
+from tts_client import ElevenLabsClient, TTSError
+from tts_scheduler import TTSScheduler
+from render_metrics import RenderMetrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,6 +38,20 @@ BG_MUSIC = BASE_PATH / "bg_music.mp3"
 
 os.makedirs(AUDIO_PATH, exist_ok=True)
 
+# ===============================
+# ⚡ TTS CONCURRENCY
+# ===============================
+# Max ElevenLabs requests in flight per render (keep within your plan's limit)
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "4"))
+# Keep-alive connections held open to ElevenLabs by the shared client
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", str(max(10, TTS_MAX_WORKERS))))
+
+# ===============================
+# 💾 TTS CLIP CACHE
+# ===============================
+# Identical lines (e.g. the fixed intro/outro) are only paid for once
+CLIP_CACHE = ClipCache(AUDIO_PATH / "cache")
+
 # ===============================
 # 🎙️ VOICE MAP (ONLY THESE)
 # ===============================
@@ -34,7 +63,113 @@ VOICE_MAP = {
 # ===============================
 # 🎧 ELEVENLABS TTS
 # ===============================
-def generate_audio(text, voice_id, filename, api_key=None):
+TTS_MODEL_ID = "eleven_multilingual_v2"
+
+# Raw PCM clips are wrapped in a WAV header and load without ffmpeg.
+# Plans that don't allow PCM fall back to MP3 automatically.
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "pcm_44100")
+FALLBACK_OUTPUT_FORMAT = "mp3_44100_128"
+# Plans (by hashed API key) known to refuse PCM; their requests go straight to MP3
+_pcm_rejected_plans = set()
+
+_default_client = None
+_default_scheduler = None
+_default_client_lock = threading.Lock()
+
+def get_tts_client():
+    """Return the process-wide ElevenLabs client, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ElevenLabsClient(pool_size=TTS_POOL_SIZE)
+        return _default_client
+
+def get_tts_scheduler():
+    """Return the process-wide TTS scheduler shared by every render."""
+    global _default_scheduler
+    with _default_client_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TTSScheduler(initial_concurrency=TTS_MAX_WORKERS)
+        return _default_scheduler
+
+def pcm_sample_rate(output_format):
+    """Return the sample rate of a pcm_<rate> output format, or None for other formats."""
+    if output_format and output_format.startswith("pcm_"):
+        return int(output_format[4:])
+    return None
+
+def _plan_id(api_key):
+    """Non-secret ID for the plan behind an API key."""
+    return hashlib.sha256((api_key or ELEVENLABS_API_KEY_DEFAULT).encode("utf-8")).hexdigest()[:16]
+
+def current_output_format(api_key=None):
+    """Return the output format to request with this API key, after any PCM fallback."""
+    if pcm_sample_rate(TTS_OUTPUT_FORMAT) and _plan_id(api_key) in _pcm_rejected_plans:
+        return FALLBACK_OUTPUT_FORMAT
+    return TTS_OUTPUT_FORMAT
+
+def rejects_output_format(error):
+    """Whether a TTS error may mean the plan doesn't allow the requested format.
+    
+    That is a 403, or a 400/422 whose detail names the output format; other
+    400/422s are ordinary validation errors (bad text, voice or settings).
+    """
+    if not isinstance(error, TTSError):
+        return False
+    if error.status_code == 403:
+        return True
+    detail = str(error).lower()
+    return error.status_code in (400, 422) and ("output_format" in detail or "output format" in detail or "pcm" in detail)
+
+def clip_extension(output_format):
+    """File extension for clips in the given output format."""
+    return ".wav" if pcm_sample_rate(output_format) else ".mp3"
+
+def file_size(filename):
+    """Size of a file in bytes, or 0 if it doesn't exist."""
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+def load_clip(filename):
+    """Load a synthesized clip, skipping ffmpeg for WAV-wrapped PCM.
+    
+    The container is sniffed from the file itself, so clips stay loadable
+    whatever format they were requested in.
+    """
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(4)
+    except OSError:
+        header = b""
+    if header == b"RIFF":
+        return AudioSegment.from_wav(str(filename))
+    return AudioSegment.from_mp3(str(filename))
+
+class _WavFrameWriter:
+    """File-like adapter that appends written bytes as frames of a WAV file."""
+
+    def __init__(self, wav):
+        self.wav = wav
+
+    def write(self, data):
+        self.wav.writeframesraw(data)
+
+def generate_audio(
+    text,
+    voice_id,
+    filename,
+    api_key=None,
+    model_id=TTS_MODEL_ID,
+    voice_settings=None,
+    cache=CLIP_CACHE,
+    client=None,
+    stream=True,
+    scheduler=None,
+    output_format=None,
+    metrics=None
+):
     """Generate audio using ElevenLabs TTS.
     
     Args:
@@ -42,35 +177,400 @@ def generate_audio(text, voice_id, filename, api_key=None):
         voice_id: ElevenLabs voice ID
         filename: Output filename
         api_key: Optional API key (uses default if not provided)
+        model_id: ElevenLabs model ID
+        voice_settings: Optional ElevenLabs voice settings dict
+        cache: ClipCache to serve repeated lines from (None disables caching)
+        client: ElevenLabsClient to send the request with (default: shared client)
+        stream: Use the streaming endpoint and write audio to disk as it arrives
+        scheduler: TTSScheduler that rate-limits and retries the request
+            (default: shared scheduler)
+        output_format: ElevenLabs output format (default: current_output_format(api_key));
+            pcm_<rate> is saved as WAV, anything else as returned (MP3)
+        metrics: Optional RenderMetrics to record this call as a "tts" stage
+    
+    Returns:
+        The output filename
     """
-    api_key = api_key or ELEVENLABS_API_KEY_DEFAULT
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": api_key,
-        "Content-Type": "application/json"
-    }
+    started = time.perf_counter()
+    output_format = output_format or current_output_format(api_key)
+    key = clip_key(voice_id, model_id, text, voice_settings, output_format)
+    if cache is not None and cache.get(key, filename):
+        if metrics:
+            metrics.record(
+                "tts", time.perf_counter() - started, bytes=file_size(filename),
+                chars=len(text), cached=True, output_format=output_format
+            )
+        return filename
+
+    client = client or get_tts_client()
+    scheduler = scheduler or get_tts_scheduler()
     payload = {
         "text": text,
-        "model_id": "eleven_multilingual_v2"
+        "model_id": model_id
     }
+    if voice_settings:
+        payload["voice_settings"] = voice_settings
+
+    api_key = api_key or ELEVENLABS_API_KEY_DEFAULT
+
+    sample_rate = pcm_sample_rate(output_format)
+
+    def request():
+        # Reopening the file truncates whatever a failed attempt left behind
+        with open(filename, "wb") as f:
+            out = f
+            if sample_rate:
+                # ElevenLabs PCM is 16-bit little-endian mono
+                out = wave.open(f, "wb")
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(sample_rate)
+            try:
+                if stream:
+                    client.stream_text_to_speech(
+                        voice_id, payload, _WavFrameWriter(out) if sample_rate else out,
+                        api_key=api_key, output_format=output_format
+                    )
+                elif sample_rate:
+                    out.writeframes(client.text_to_speech(voice_id, payload, api_key=api_key, output_format=output_format))
+                else:
+                    out.write(client.text_to_speech(voice_id, payload, api_key=api_key, output_format=output_format))
+            finally:
+                if sample_rate:
+                    out.close()
+
+    try:
+        scheduler.call(request, cost=len(text))
+    except Exception as e:
+        # Never leave a truncated clip behind for the decoder to pick up
+        if os.path.exists(filename):
+            os.remove(filename)
+        if sample_rate and rejects_output_format(e):
+            # Retry once as MP3; if that works, this plan can't have raw PCM
+            generate_audio(
+                text, voice_id, filename, api_key=api_key, model_id=model_id,
+                voice_settings=voice_settings, cache=cache, client=client,
+                stream=stream, scheduler=scheduler, output_format=FALLBACK_OUTPUT_FORMAT,
+                metrics=metrics
+            )
+            _pcm_rejected_plans.add(_plan_id(api_key))
+            return filename
+        raise
+
+    if metrics:
+        metrics.record(
+            "tts", time.perf_counter() - started, bytes=file_size(filename),
+            chars=len(text), cached=False, output_format=output_format
+        )
 
-    r = requests.post(url, json=payload, headers=headers)
-    if r.status_code != 200:
-        raise Exception(r.text)
+    if cache is not None:
+        cache.put(key, filename)
+    return filename
 
-    with open(filename, "wb") as f:
-        f.write(r.content)
+# ===============================
+# 🗂️ JOB WORKSPACES
+# ===============================
+# Each render gets its own directory for intermediate clips, removed when
+# it finishes, and a uniquely named output file, so renders never collide
+JOBS_PATH = AUDIO_PATH / "jobs"
+SHOWS_PATH = AUDIO_PATH / "shows"
+# Workspaces older than this are leftovers from a crashed process
+WORKSPACE_MAX_AGE_S = 6 * 60 * 60
+
+def new_job_id():
+    """Return a fresh random job ID."""
+    return uuid.uuid4().hex[:12]
+
+def create_workspace(job_id):
+    """Create and return the intermediate-file directory for a job."""
+    if not job_id or not re.fullmatch(r"[A-Za-z0-9_-]+", job_id):
+        raise ValueError(f"Invalid job ID: {job_id!r}")
+    workspace = JOBS_PATH / job_id
+    os.makedirs(workspace, exist_ok=True)
+    return workspace
+
+def remove_workspace(workspace):
+    """Delete a job's intermediate files."""
+    shutil.rmtree(workspace, ignore_errors=True)
+
+def clean_stale_workspaces(max_age_s=WORKSPACE_MAX_AGE_S):
+    """Remove workspaces abandoned by renders that never finished.
+    
+    Returns:
+        Number of workspaces removed
+    """
+    if not JOBS_PATH.exists():
+        return 0
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for workspace in JOBS_PATH.iterdir():
+        try:
+            if workspace.is_dir() and workspace.stat().st_mtime < cutoff:
+                remove_workspace(workspace)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+# Uploaded background music, named by content so sessions never overwrite
+# each other's files; cleaned up by retention.py like other generated audio
+UPLOADS_PATH = AUDIO_PATH / "uploads"
+
+def save_upload(data, suffix):
+    """Store uploaded bytes and return their path."""
+    os.makedirs(UPLOADS_PATH, exist_ok=True)
+    path = UPLOADS_PATH / f"{hashlib.sha256(data).hexdigest()[:16]}{suffix.lower()}"
+    if not path.exists():
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    else:
+        os.utime(path)
+    return path
+
+def show_output_path(job_id):
+    """Return the unique final MP3 path for a job."""
+    os.makedirs(SHOWS_PATH, exist_ok=True)
+    return SHOWS_PATH / f"radio_show_{job_id}.mp3"
+
+# ===============================
+# ♻️ RENDER MANIFESTS (incremental re-render)
+# ===============================
+RENDERS_PATH = AUDIO_PATH / "renders"
+MANIFEST_NAME = "manifest.json"
+
+def get_render_dir(render_key):
+    """Return the clip directory for a script's render manifest."""
+    if not render_key or not re.fullmatch(r"[A-Za-z0-9_-]+", render_key):
+        raise ValueError(f"Invalid render key: {render_key!r}")
+    return RENDERS_PATH / render_key
+
+# Renders of the same key share its clip directory and prune clips their
+# own script doesn't use, so they run one at a time (within this process)
+_render_dir_locks = {}  # render key -> [lock, users]
+_render_dir_locks_guard = threading.Lock()
+
+@contextmanager
+def lock_render_dir(render_key):
+    """Hold a render key's clip directory for a whole render (no-op without a key)."""
+    if not render_key:
+        yield
+        return
+    with _render_dir_locks_guard:
+        entry = _render_dir_locks.setdefault(render_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _render_dir_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _render_dir_locks[render_key]
+
+def load_manifest(render_dir):
+    """Load a render manifest mapping line keys to clip filenames."""
+    try:
+        with open(Path(render_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+def save_manifest(render_dir, manifest):
+    """Atomically write a render manifest."""
+    path = Path(render_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def iter_synthesized_dialogue(
+    dialogue,
+    log,
+    api_key=None,
+    max_workers=None,
+    tts_client=None,
+    render_key=None,
+    tts_scheduler=None,
+    clip_cache=CLIP_CACHE,
+    metrics=None,
+    workspace=None
+):
+    """Synthesize every dialogue line, running up to max_workers requests at once.
+    
+    Yields (index, clip path) in script order, each as soon as that line and
+    every line before it are ready. Progress is reported once per finished line.
+    
+    Clips are written to the workspace directory, which the caller creates
+    and removes (see create_workspace). With a render_key they are kept
+    instead in a per-script directory next to a manifest of the lines they
+    were made from. Re-rendering the same key only synthesizes lines that
+    were added or changed since the last render.
+    """
+    total = len(dialogue)
+    output_format = current_output_format(api_key)
+    ext = clip_extension(output_format)
+
+    keys = [clip_key(VOICE_MAP[speaker], TTS_MODEL_ID, text) for speaker, text in dialogue]
+    if render_key:
+        render_dir = get_render_dir(render_key)
+        os.makedirs(render_dir, exist_ok=True)
+        manifest = load_manifest(render_dir)
+        filenames = [
+            render_dir / manifest.get(key, f"{key[:16]}_{speaker}{ext}")
+            for key, (speaker, _) in zip(keys, dialogue)
+        ]
+    else:
+        if not workspace:
+            raise ValueError("A workspace is required unless render_key is given")
+        workspace = Path(workspace)
+        # A repeated line shares the clip of its first occurrence
+        first = {}
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        filenames = [workspace / f"{first[key]}_{speaker}{ext}" for key, (speaker, _) in zip(keys, dialogue)]
+
+    # Lines whose clip is already on disk, plus repeats within this script,
+    # don't need a request of their own
+    pending = {}
+    ready = set()
+    for i, key in enumerate(keys):
+        if key in pending or key in ready:
+            continue
+        if render_key and key in manifest and filenames[i].exists():
+            ready.add(key)
+            continue
+        pending[key] = i
+
+    done = total - len(pending)
+    if render_key and ready:
+        log(f"♻️ Reusing {len(ready)} unchanged line(s)")
+
+    next_index = 0
+
+    def ready_prefix():
+        nonlocal next_index
+        while next_index < total and keys[next_index] in ready:
+            yield next_index, filenames[next_index]
+            next_index += 1
+
+    yield from ready_prefix()
+
+    if pending:
+        workers = max(1, min(max_workers or TTS_MAX_WORKERS, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    generate_audio, dialogue[i][1], VOICE_MAP[dialogue[i][0]], str(filenames[i]),
+                    api_key=api_key, client=tts_client, output_format=output_format,
+                    scheduler=tts_scheduler, cache=clip_cache, metrics=metrics
+                ): key
+                for key, i in pending.items()
+            }
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    ready.add(futures[future])
+                    done += 1
+                    log(f"🔊 Voice {done}/{total}")
+                    yield from ready_prefix()
+            except BaseException:
+                # Don't keep paying for lines of a show that has failed or been abandoned
+                for future in futures:
+                    future.cancel()
+                raise
+
+    if render_key:
+        manifest = {key: filename.name for key, filename in zip(keys, filenames)}
+        save_manifest(render_dir, manifest)
+        # Drop clips for lines that were edited out of the script
+        in_use = set(manifest.values())
+        for clip in render_dir.iterdir():
+            if clip.name != MANIFEST_NAME and clip.name not in in_use:
+                clip.unlink()
+
+def synthesize_dialogue(dialogue, log, **kwargs):
+    """Synthesize every dialogue line and return the clip paths in script order.
+    
+    Takes the same options as iter_synthesized_dialogue.
+    """
+    return [filename for _, filename in iter_synthesized_dialogue(dialogue, log, **kwargs)]
 
 # ===============================
 # 🧠 FINAL ENGINE FUNCTION
 # ===============================
+def parse_line(line):
+    """Return (speaker, text) for one dialogue line, or None if it isn't one."""
+    line = line.strip()
+    if line.startswith("Anjli:"):
+        return ("Anjli", line[6:].strip())
+    elif line.startswith("Hitesh:"):
+        return ("Hitesh", line[7:].strip())
+    return None
+
+def parse_script(script_text):
+    """Split a script into (speaker, text) pairs, skipping non-dialogue lines."""
+    dialogue = []
+    for line in script_text.split("\n"):
+        parsed = parse_line(line)
+        if parsed:
+            dialogue.append(parsed)
+
+    if not dialogue:
+        raise Exception("No valid dialogue found in script")
+    return dialogue
+
+def resolve_bg_music(bg_music_path, log):
+    """Pick the background music file, falling back to the default one."""
+    music_path = Path(bg_music_path) if bg_music_path else BG_MUSIC
+    if music_path.exists():
+        log("🎼 Mixing background music")
+        return music_path
+    if BG_MUSIC.exists():
+        log("🎼 Mixing background music (using default)")
+        return BG_MUSIC
+    return None
+
+def mix_and_export(filenames, log, metrics, output_file, pause_duration_ms=800, bg_music_volume_db=-12, bg_music_path=None):
+    """Decode the clips, lay them out with pauses, mix in music and export the MP3."""
+    clips = []
+    for filename in filenames:
+        with metrics.stage("decode", bytes=file_size(filename)):
+            clips.append(load_clip(filename))
+
+    # Pauses go between dialogues (not after the last one)
+    with metrics.stage("concat") as stage:
+        final_audio = assemble_timeline(clips, pause_duration_ms)
+        stage["bytes"] = len(final_audio.raw_data)
+
+    music_path = resolve_bg_music(bg_music_path, log)
+    if music_path:
+        with metrics.stage("bg_decode", bytes=file_size(music_path)):
+            bg = load_background(music_path, final_audio.frame_rate)
+        with metrics.stage("mix"):
+            final_audio = mix_background(final_audio, bg, bg_music_volume_db)
+
+    with metrics.stage("export") as stage:
+        final_audio.export(str(output_file), format="mp3")
+        stage["bytes"] = file_size(output_file)
+    return output_file
+
 def generate_radio_show_from_script(
     script_text, 
     progress_callback=None, 
     elevenlabs_api_key=None,
     pause_duration_ms=800,
     bg_music_volume_db=-12,
-    bg_music_path=None
+    bg_music_path=None,
+    max_workers=None,
+    tts_client=None,
+    render_key=None,
+    tts_scheduler=None,
+    clip_cache=CLIP_CACHE,
+    metrics=None,
+    job_id=None,
+    output_file=None
 ):
     """Generate radio show audio from script.
     
@@ -81,61 +581,292 @@ def generate_radio_show_from_script(
         pause_duration_ms: Duration of pause between dialogues in milliseconds (default: 800ms)
         bg_music_volume_db: Background music volume in dB (default: -12, negative = quieter)
         bg_music_path: Optional custom path to background music file
+        max_workers: Max TTS requests in flight at once (default: TTS_MAX_WORKERS)
+        tts_client: Optional ElevenLabsClient to share across renders (default: shared client)
+        render_key: Optional stable ID for this script; re-rendering with the same key
+            only synthesizes lines that changed since the last render. Renders with
+            the same key wait for each other, since they share one clip directory
+        tts_scheduler: Optional TTSScheduler for rate limiting and retries (default: shared scheduler)
+        clip_cache: ClipCache for synthesized lines (default: CLIP_CACHE, None disables it)
+        metrics: Optional RenderMetrics to record per-stage timings in
+            (default: a new one sending to the configured sinks)
+        job_id: ID naming this render's workspace and output file (default: random)
+        output_file: Where to write the MP3 (default: Audios/shows/radio_show_<job_id>.mp3)
+    
+    Returns:
+        Path of the finished MP3
+    """
+    def log(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    log("🎙️ Generating audio from approved script")
+    job_id = job_id or new_job_id()
+    metrics = metrics or RenderMetrics(job_id)
+    workspace = create_workspace(job_id)
+
+    try:
+        with lock_render_dir(render_key):
+            with metrics.stage("parse", chars=len(script_text)):
+                dialogue = parse_script(script_text)
+
+            filenames = synthesize_dialogue(
+                dialogue, log, api_key=elevenlabs_api_key, max_workers=max_workers,
+                tts_client=tts_client, render_key=render_key, tts_scheduler=tts_scheduler,
+                clip_cache=clip_cache, metrics=metrics, workspace=workspace
+            )
+
+            output_file = mix_and_export(
+                filenames, log, metrics, Path(output_file) if output_file else show_output_path(job_id),
+                pause_duration_ms=pause_duration_ms, bg_music_volume_db=bg_music_volume_db,
+                bg_music_path=bg_music_path
+            )
+    except BaseException:
+        metrics.finish("error")
+        raise
+    finally:
+        remove_workspace(workspace)
+
+    metrics.finish()
+    log("✅ Radio show complete")
+    return str(output_file)
+
+# ===============================
+# 📡 PROGRESSIVE OUTPUT
+# ===============================
+def stream_radio_show_from_script(
+    script_text,
+    progress_callback=None,
+    elevenlabs_api_key=None,
+    pause_duration_ms=800,
+    bg_music_volume_db=-12,
+    bg_music_path=None,
+    max_workers=None,
+    tts_client=None,
+    render_key=None,
+    tts_scheduler=None,
+    clip_cache=CLIP_CACHE,
+    segment_dir=None,
+    chunk_format="mp3",
+    metrics=None,
+    job_id=None
+):
+    """Render a radio show progressively, yielding it one line at a time.
+    
+    Lines are still synthesized concurrently, but each one is mixed and
+    encoded as soon as it and every line before it are ready, so playback
+    can start after the first line instead of after the whole show.
+    
+    Every chunk is encoded on its own. With chunk_format="raw" the chunks
+    are the show's PCM samples, and joining them in order gives exactly the
+    full mix. Encoded chunks (MP3 etc.) are standalone files with their own
+    headers and encoder padding, so play them one after another (e.g. from
+    the segment playlist) rather than joining their bytes; for a single
+    gapless MP3 use generate_radio_show_from_script.
+    
+    Takes the same options as generate_radio_show_from_script (except
+    output_file), plus:
+        segment_dir: Optional directory to also write each chunk to as
+            segment_NNN.<format>, with a playlist.m3u listing the segments so far
+        chunk_format: Encoding for each chunk (default: mp3; "raw" for PCM samples)
+    
+    Yields:
+        Dicts with index, total, start_ms, duration_ms, data (encoded bytes)
+        and path (segment file, or None without segment_dir)
     """
     def log(msg):
         if progress_callback:
             progress_callback(msg)
 
     log("🎙️ Generating audio from approved script")
+    job_id = job_id or new_job_id()
+    metrics = metrics or RenderMetrics(job_id)
+    workspace = create_workspace(job_id)
+
+    try:
+        with lock_render_dir(render_key):
+            with metrics.stage("parse", chars=len(script_text)):
+                dialogue = parse_script(script_text)
+            total = len(dialogue)
+            music_path = resolve_bg_music(bg_music_path, log)
+            bg = None
+
+            if segment_dir:
+                segment_dir = Path(segment_dir)
+                os.makedirs(segment_dir, exist_ok=True)
+                playlist = segment_dir / "playlist.m3u"
+                playlist.write_text("#EXTM3U\n", encoding="utf-8")
+
+            start_frame = 0
+            start_ms = 0.0
+            lines = iter_synthesized_dialogue(
+                dialogue, log, api_key=elevenlabs_api_key, max_workers=max_workers,
+                tts_client=tts_client, render_key=render_key, tts_scheduler=tts_scheduler,
+                clip_cache=clip_cache, metrics=metrics, workspace=workspace
+            )
+            for i, filename in lines:
+                with metrics.stage("decode", bytes=file_size(filename)):
+                    clip = load_clip(filename)
+                # Each chunk carries the pause that follows its line
+                pause_ms = pause_duration_ms if i < total - 1 else 0
+                with metrics.stage("concat") as stage:
+                    chunk = assemble_timeline([clip], 0, trailing_pause_ms=pause_ms)
+                    stage["bytes"] = len(chunk.raw_data)
+
+                if music_path:
+                    if bg is None:
+                        with metrics.stage("bg_decode", bytes=file_size(music_path)):
+                            bg = load_background(music_path, chunk.frame_rate)
+                    with metrics.stage("mix"):
+                        chunk = mix_background(chunk, bg, bg_music_volume_db, start_frame=start_frame)
+
+                with metrics.stage("export") as stage:
+                    buffer = io.BytesIO()
+                    chunk.export(buffer, format=chunk_format)
+                    data = buffer.getvalue()
+                    stage["bytes"] = len(data)
+
+                path = None
+                if segment_dir:
+                    path = segment_dir / f"segment_{i:03d}.{chunk_format}"
+                    path.write_bytes(data)
+                    with open(playlist, "a", encoding="utf-8") as f:
+                        f.write(f"{path.name}\n")
 
+                yield {
+                    "index": i,
+                    "total": total,
+                    "start_ms": start_ms,
+                    "duration_ms": len(chunk),
+                    "data": data,
+                    "path": str(path) if path else None,
+                }
+                start_frame += int(chunk.frame_count())
+                start_ms += chunk.duration_seconds * 1000
+    except BaseException:
+        metrics.finish("error")
+        raise
+    finally:
+        remove_workspace(workspace)
+
+    metrics.finish()
+    log("✅ Radio show complete")
+
+# ===============================
+# 🌊 STREAMED SCRIPTS (unattended mode)
+# ===============================
+def synthesize_streamed_dialogue(
+    lines,
+    log,
+    api_key=None,
+    max_workers=None,
+    tts_client=None,
+    tts_scheduler=None,
+    clip_cache=CLIP_CACHE,
+    metrics=None,
+    workspace=None
+):
+    """Synthesize dialogue lines while they are still being written.
+    
+    Each line from the iterable (e.g. an LLM completion split as it streams)
+    is sent to TTS as soon as it arrives, so synthesis overlaps with writing
+    instead of waiting for the whole script. Non-dialogue lines are skipped.
+    Clips are written to the workspace directory, which the caller creates
+    and removes.
+    
+    Returns:
+        (dialogue, clip paths), both in script order
+    """
+    output_format = current_output_format(api_key)
+    ext = clip_extension(output_format)
+    if not workspace:
+        raise ValueError("A workspace is required")
+    workspace = Path(workspace)
     dialogue = []
-    for line in script_text.split("\n"):
-        line = line.strip()
-        if line.startswith("Anjli:"):
-            dialogue.append(("Anjli", line[6:].strip()))
-        elif line.startswith("Hitesh:"):
-            dialogue.append(("Hitesh", line[7:].strip()))
+    futures = []
+    done = 0
 
-    if not dialogue:
-        raise Exception("No valid dialogue found in script")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or TTS_MAX_WORKERS)) as pool:
+        try:
+            for line in lines:
+                parsed = parse_line(line)
+                if not parsed:
+                    continue
+                speaker, text = parsed
+                filename = workspace / f"{len(dialogue)}_{speaker}{ext}"
+                dialogue.append(parsed)
+                futures.append(pool.submit(
+                    generate_audio, text, VOICE_MAP[speaker], str(filename),
+                    api_key=api_key, client=tts_client, output_format=output_format,
+                    scheduler=tts_scheduler, cache=clip_cache, metrics=metrics
+                ))
 
-    audio_segments = []
-    pause = AudioSegment.silent(duration=pause_duration_ms)
+            if not dialogue:
+                raise Exception("No valid dialogue found in script")
 
-    for i, (speaker, text) in enumerate(dialogue):
-        log(f"🔊 Voice {i+1}/{len(dialogue)}")
-        filename = AUDIO_PATH / f"{i}_{speaker}.mp3"
-        generate_audio(text, VOICE_MAP[speaker], str(filename), api_key=elevenlabs_api_key)
-        segment = AudioSegment.from_mp3(str(filename))
-        audio_segments.append(segment)
-        
-        # Add pause after each dialogue (except the last one)
-        if i < len(dialogue) - 1:
-            audio_segments.append(pause)
+            for future in as_completed(futures):
+                future.result()
+                done += 1
+                log(f"🔊 Voice {done}/{len(futures)}")
+        except BaseException:
+            # Don't keep paying for lines of a show that has failed or been abandoned
+            for future in futures:
+                future.cancel()
+            raise
 
-    final_audio = sum(audio_segments)
+    return dialogue, [future.result() for future in futures]
 
-    # Determine background music path
-    music_path = Path(bg_music_path) if bg_music_path else BG_MUSIC
+def generate_radio_show_from_lines(
+    lines,
+    progress_callback=None,
+    elevenlabs_api_key=None,
+    pause_duration_ms=800,
+    bg_music_volume_db=-12,
+    bg_music_path=None,
+    max_workers=None,
+    tts_client=None,
+    tts_scheduler=None,
+    clip_cache=CLIP_CACHE,
+    metrics=None,
+    job_id=None,
+    output_file=None
+):
+    """Generate a radio show from script lines that arrive over time.
     
-    if music_path.exists():
-        log("🎼 Mixing background music")
-        bg = AudioSegment.from_mp3(str(music_path))
-        # Apply volume adjustment
-        bg = bg + bg_music_volume_db
-        # Loop background music to match audio length
-        bg = bg * (len(final_audio)//len(bg)+1)
-        # Overlay background music with dialogue
-        final_audio = bg[:len(final_audio)].overlay(final_audio)
-    elif BG_MUSIC.exists():
-        # Fallback to default if custom path doesn't exist
-        log("🎼 Mixing background music (using default)")
-        bg = AudioSegment.from_mp3(str(BG_MUSIC)) + bg_music_volume_db
-        bg = bg * (len(final_audio)//len(bg)+1)
-        final_audio = bg[:len(final_audio)].overlay(final_audio)
+    For unattended runs with no review step: pass the lines of a streaming
+    LLM completion and TTS starts on the first line while the rest is still
+    being generated. Takes the same options as generate_radio_show_from_script
+    (except render_key).
+    
+    Returns:
+        (path of the finished MP3, the script text that was rendered)
+    """
+    def log(msg):
+        if progress_callback:
+            progress_callback(msg)
 
-    output_file = BASE_PATH / "final_radio_show.mp3"
-    final_audio.export(str(output_file), format="mp3")
+    log("🎙️ Generating audio while the script is written")
+    job_id = job_id or new_job_id()
+    metrics = metrics or RenderMetrics(job_id)
+    workspace = create_workspace(job_id)
 
+    try:
+        dialogue, filenames = synthesize_streamed_dialogue(
+            lines, log, api_key=elevenlabs_api_key, max_workers=max_workers,
+            tts_client=tts_client, tts_scheduler=tts_scheduler, clip_cache=clip_cache,
+            metrics=metrics, workspace=workspace
+        )
+        output_file = mix_and_export(
+            filenames, log, metrics, Path(output_file) if output_file else show_output_path(job_id),
+            pause_duration_ms=pause_duration_ms, bg_music_volume_db=bg_music_volume_db,
+            bg_music_path=bg_music_path
+        )
+    except BaseException:
+        metrics.finish("error")
+        raise
+    finally:
+        remove_workspace(workspace)
+
+    metrics.finish()
     log("✅ Radio show complete")
-    return str(output_file)
+    return str(output_file), "\n".join(f"{speaker}: {text}" for speaker, text in dialogue)
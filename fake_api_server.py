@@ -0,0 +1,278 @@
+"""
+Fake API Server
+Local stand-in for the ElevenLabs TTS and OpenAI chat-completions APIs
+
+Serves real audio with configurable latency, jitter and 429 rates, so the
+render pipeline can be load-tested without network access or API spend.
+
+Usage:
+    python fake_api_server.py --port 8765 --latency 0.3 --jitter 0.1 --rate-429 0.05
+
+Then point the app or the benchmark at it:
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+The default port stays clear of Streamlit (8501) and the app's audio
+server (8610), so all three can run on one machine.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+SAMPLE_MP3 = Path(__file__).parent / "final_radio_show.mp3"
+
+# Roughly how long ElevenLabs takes to say one character
+MS_PER_CHAR = 60
+MP3_BYTES_PER_SECOND = 16000  # 128 kbps
+
+TTS_PATH = re.compile(r"^/v1/text-to-speech/([^/]+)(/stream)?$")
+
+
+class FakeAPIConfig:
+    """Behaviour knobs shared by every request to one server.
+
+    Args:
+        latency: Base response delay in seconds
+        jitter: Extra uniformly random delay in seconds (0..jitter)
+        rate_429: Probability of answering 429 instead of audio
+        retry_after: Retry-After seconds sent with 429 responses
+        sample_mp3: MP3 file whose frames are served for mp3_* formats
+        seed: Optional random seed for reproducible runs
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.1,
+        rate_429: float = 0.0,
+        retry_after: float = 1.0,
+        sample_mp3: Path = SAMPLE_MP3,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.mp3_frames = _strip_id3(Path(sample_mp3).read_bytes()) if Path(sample_mp3).exists() else b""
+        self.lock = threading.Lock()
+        self.counts = {"tts": 0, "chat": 0, "throttled": 0}
+
+    def delay(self) -> float:
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def throttle(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.rate_429
+
+
+def _strip_id3(data: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so slices start on MP3 frame data."""
+    if data[:3] == b"ID3" and len(data) > 10:
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        return data[10 + size:]
+    return data
+
+
+def speech_pcm(text: str, sample_rate: int) -> bytes:
+    """Make 16-bit mono PCM with a duration proportional to the text length."""
+    frames = int(sample_rate * len(text) * MS_PER_CHAR / 1000)
+    pitch = 180 + (sum(map(ord, text)) % 120)
+    t = np.arange(frames) / sample_rate
+    return (8000 * np.sin(2 * np.pi * pitch * t)).astype("<i2").tobytes()
+
+
+def speech_mp3(text: str, config: FakeAPIConfig) -> bytes:
+    """Slice real MP3 frames with a duration proportional to the text length."""
+    size = max(1, int(MP3_BYTES_PER_SECOND * len(text) * MS_PER_CHAR / 1000))
+    frames = config.mp3_frames
+    if not frames:
+        raise RuntimeError(f"Sample MP3 not found: {SAMPLE_MP3}")
+    start = config.random.randrange(max(1, len(frames) - size))
+    return frames[start:start + size]
+
+
+def fake_script(lines: int = 30) -> str:
+    """Alternating Anjli/Hitesh dialogue in the shape the real prompt asks for."""
+    speakers = ("Anjli", "Hitesh")
+    return "\n".join(
+        f"{speakers[i % 2]}: Yeh Radio AI ki line number {i + 1} hai, aur topic kaafi interesting hai."
+        for i in range(lines)
+    )
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    config: FakeAPIConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _maybe_throttle(self) -> bool:
+        if not self.config.throttle():
+            return False
+        with self.config.lock:
+            self.config.counts["throttled"] += 1
+        self._send_json(
+            429,
+            {"detail": {"status": "too_many_concurrent_requests", "message": "Fake rate limit"}},
+            {"Retry-After": str(self.config.retry_after)},
+        )
+        return True
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        payload = self._read_json()
+        time.sleep(self.config.delay())
+        if self._maybe_throttle():
+            return
+
+        match = TTS_PATH.match(url.path)
+        if match:
+            self._handle_tts(payload, parse_qs(url.query), streaming=bool(match.group(2)))
+        elif url.path == "/v1/chat/completions":
+            self._handle_chat(payload)
+        else:
+            self._send_json(404, {"detail": "Not found"})
+
+    def _handle_tts(self, payload: Dict, query: Dict, streaming: bool):
+        text = payload.get("text", "")
+        output_format = query.get("output_format", ["mp3_44100_128"])[0]
+        with self.config.lock:
+            self.config.counts["tts"] += 1
+
+        if output_format.startswith("pcm_"):
+            body, content_type = speech_pcm(text, int(output_format[4:])), "audio/pcm"
+        else:
+            body, content_type = speech_mp3(text, self.config), "audio/mpeg"
+
+        if not streaming:
+            self._send(200, body, content_type)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(body), 4096):
+            chunk = body[start:start + 4096]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _handle_chat(self, payload: Dict):
+        with self.config.lock:
+            self.config.counts["chat"] += 1
+        content = fake_script()
+        model = payload.get("model", "gpt-4o-mini")
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        # Server-sent events, a few words per delta like the real API
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = re.findall(r"\S+\s*", content)
+        for start in range(0, len(pieces), 3):
+            event = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": "".join(pieces[start:start + 3])}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.config.delay() / 50)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def start_fake_server(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a fake API server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+        **config: FakeAPIConfig options
+
+    Returns:
+        (server, base_url); call server.shutdown() to stop it
+    """
+    handler = type("ConfiguredFakeAPIHandler", (FakeAPIHandler,), {"config": FakeAPIConfig(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake ElevenLabs/OpenAI server for local load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random delay, up to this many seconds")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s (s)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(
+        args.host, args.port,
+        latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    print(f"Fake API server listening on {base_url}")
+    print(f"  ELEVENLABS_BASE_URL={base_url}")
+    print(f"  OPENAI_BASE_URL={base_url}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
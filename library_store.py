@@ -0,0 +1,141 @@
+"""
+Library Store
+Content-addressed storage for the audio of saved shows
+
+Saving a show moves its audio to Audios/library/<aa>/<sha256>.<ext>, so
+identical files are stored once however many shows use them. Each file's
+reference count lives in the history database and is updated in the same
+transaction as the show, and files are deleted as soon as no show
+references them.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+LIBRARY_PATH = Path(__file__).parent / "Audios" / "library"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS library_files (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL
+);
+"""
+
+
+def create_schema(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def file_digest(path) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(digest: str, suffix: str) -> Path:
+    """Library location for content with this digest."""
+    return LIBRARY_PATH / digest[:2] / f"{digest}{suffix}"
+
+
+def store(conn: sqlite3.Connection, src, digest: Optional[str] = None, move: bool = True) -> str:
+    """Put a file in the library and take a reference to it.
+
+    Call inside the write transaction that saves the show, so the file
+    can't be collected between being placed and being referenced.
+
+    Args:
+        conn: History database connection, in a write transaction
+        src: File to store
+        digest: Precomputed file_digest(src), to hash outside the transaction
+        move: Move src into the library (False copies it)
+
+    Returns:
+        The library path now holding the content
+    """
+    src = Path(src)
+    digest = digest or file_digest(src)
+    row = conn.execute("SELECT path FROM library_files WHERE digest = ?", (digest,)).fetchone()
+    dest = Path(row[0]) if row else blob_path(digest, src.suffix)
+
+    if dest.exists():
+        # Already stored; the new copy isn't needed
+        if move and src.resolve() != dest.resolve():
+            src.unlink()
+    else:
+        os.makedirs(dest.parent, exist_ok=True)
+        tmp_path = dest.with_suffix(f".{threading.get_ident()}.tmp")
+        if move:
+            shutil.move(str(src), tmp_path)
+        else:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+
+    conn.execute(
+        "INSERT INTO library_files (digest, path, size, refcount) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1",
+        (digest, str(dest), dest.stat().st_size),
+    )
+    return str(dest)
+
+
+def release(conn: sqlite3.Connection, audio_file: Optional[str]):
+    """Drop one reference to a library file, deleting it when none are left.
+
+    Paths outside the library (e.g. shows saved before it existed) are ignored.
+    """
+    if not audio_file:
+        return
+    row = conn.execute("SELECT digest, refcount FROM library_files WHERE path = ?", (str(audio_file),)).fetchone()
+    if row is None:
+        return
+    if row[1] > 1:
+        conn.execute("UPDATE library_files SET refcount = refcount - 1 WHERE digest = ?", (row[0],))
+        return
+    conn.execute("DELETE FROM library_files WHERE digest = ?", (row[0],))
+    _remove(audio_file)
+
+
+def collect_garbage(conn: sqlite3.Connection) -> int:
+    """Recount references from the shows table and delete unreferenced files.
+
+    Also removes files in the library directory that the database doesn't
+    know about (e.g. left by a crash between placing and referencing).
+
+    Returns:
+        Number of files deleted
+    """
+    conn.execute(
+        "UPDATE library_files SET refcount = "
+        "(SELECT COUNT(*) FROM shows WHERE shows.audio_file = library_files.path)"
+    )
+    orphans = [row[0] for row in conn.execute("SELECT path FROM library_files WHERE refcount <= 0")]
+    conn.execute("DELETE FROM library_files WHERE refcount <= 0")
+    known = {row[0] for row in conn.execute("SELECT path FROM library_files")}
+    if LIBRARY_PATH.exists():
+        orphans += [str(p) for p in LIBRARY_PATH.glob("*/*") if p.is_file() and str(p) not in known]
+    for path in orphans:
+        _remove(path)
+    return len(orphans)
+
+
+def usage(conn: sqlite3.Connection) -> dict:
+    """Files and bytes held by the library."""
+    files, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM library_files").fetchone()
+    return {"files": files, "bytes": size}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -2,8 +2,8 @@
 import ipywidgets as widgets
 from IPython.display import display, Audio, clear_output
 from engine import generate_radio_show_from_script
+from script_gen import fetch_wikipedia_summary
 from openai import OpenAI
-import wikipedia
 
 # ===============================
 # 🔑 OPENAI API KEY
@@ -66,7 +66,7 @@ def generate_script():
     global current_script
 
     status.value = "🔍 Fetching Wikipedia content"
-    wiki = wikipedia.summary(current_topic, sentences=20)
+    wiki = fetch_wikipedia_summary(current_topic, sentences=20)
 
     status.value = "✍️ Writing radio conversation"
 
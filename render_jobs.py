@@ -0,0 +1,311 @@
+"""
+Render Jobs
+Persistent background queue for radio show renders
+
+Renders are submitted as jobs and run by a fixed pool of worker threads,
+so the number of renders in flight is set by the server, not by how many
+browser tabs are open. Jobs are saved to a JSON file on every state change;
+a client can poll a job by ID and pick up its result after reconnecting,
+and jobs interrupted by a restart are queued again on startup.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from engine import ELEVENLABS_API_KEY_DEFAULT, clean_stale_workspaces, generate_radio_show_from_script
+from render_metrics import RenderMetrics
+
+JOBS_FILE = Path(__file__).parent / "render_jobs.json"
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Finished jobs kept in the jobs file; older ones are dropped
+JOB_HISTORY_LIMIT = int(os.getenv("RENDER_JOB_HISTORY", "200"))
+# Minimum seconds between saves for progress-only updates
+PROGRESS_SAVE_INTERVAL = 1.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def parse_progress(msg: str) -> Optional[float]:
+    """Turn an engine "Voice X/Y" log message into a 0..1 fraction, if it is one."""
+    if "Voice" not in msg:
+        return None
+    try:
+        current, total = msg.split("Voice", 1)[1].strip().split()[0].split("/")
+        return int(current) / int(total)
+    except (ValueError, IndexError, ZeroDivisionError):
+        return None
+
+
+def job_secrets(elevenlabs_api_key: Optional[str]) -> Dict:
+    """API keys to submit with a render: only those the server doesn't already have.
+
+    A job without secrets can be queued again after a restart, so the
+    server's default key is left out rather than passed along.
+    """
+    if elevenlabs_api_key and elevenlabs_api_key != ELEVENLABS_API_KEY_DEFAULT:
+        return {"elevenlabs_api_key": elevenlabs_api_key}
+    return {}
+
+
+def run_render(job: Dict, progress_callback: Callable, secrets: Dict) -> Dict:
+    """Default job runner: render the job's script with its options."""
+    options = job["options"]
+    metrics = RenderMetrics(job["id"])
+    audio_file = generate_radio_show_from_script(
+        job["script"],
+        progress_callback,
+        elevenlabs_api_key=secrets.get("elevenlabs_api_key"),
+        pause_duration_ms=options.get("pause_duration_ms", 800),
+        bg_music_volume_db=options.get("bg_music_volume_db", -12),
+        bg_music_path=options.get("bg_music_path"),
+        render_key=options.get("render_key"),
+        metrics=metrics,
+        job_id=job["id"]
+    )
+    return {"audio_file": audio_file, "metrics": metrics.summary()}
+
+
+class RenderJobQueue:
+    """Fixed-size worker pool draining a persistent queue of render jobs.
+
+    Args:
+        jobs_file: JSON file the jobs are persisted to
+        workers: Number of renders that run at the same time
+        runner: Function (job, progress_callback, secrets) -> result dict
+            (default: run_render)
+        autostart: Start the workers right away
+    """
+
+    def __init__(
+        self,
+        jobs_file: Path = JOBS_FILE,
+        workers: int = RENDER_WORKERS,
+        runner: Callable = run_render,
+        autostart: bool = True,
+    ):
+        self.jobs_file = Path(jobs_file)
+        self.workers = max(1, workers)
+        self.runner = runner
+        self._jobs = {}
+        self._secrets = {}  # job id -> API keys; kept in memory only, never saved
+        self._queue = queue.Queue()
+        self._lock = threading.RLock()
+        self._threads = []
+        self._last_save = 0.0
+        clean_stale_workspaces()
+        self._load()
+        if autostart:
+            self.start()
+
+    # ---- persistence ----
+    def _load(self):
+        if not self.jobs_file.exists():
+            return
+        try:
+            with open(self.jobs_file, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return
+        for job in sorted(jobs, key=lambda j: j["created_at"]):
+            if job["status"] in (QUEUED, RUNNING) and job.get("uses_own_keys"):
+                # Its API keys were never saved; running it now would bill the default account
+                message = "Interrupted by a server restart; approve the script again to re-enter your API keys"
+                job.update(status=FAILED, error=message, message=message, finished_at=datetime.now().isoformat())
+            elif job["status"] == RUNNING:
+                # The process died mid-render; run it again from the start
+                job.update(status=QUEUED, progress=0.0, message="Requeued after restart", started_at=None)
+            self._jobs[job["id"]] = job
+            if job["status"] == QUEUED:
+                self._queue.put(job["id"])
+
+    def _save(self):
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j["status"] in FINISHED_STATES]
+            finished.sort(key=lambda j: j["created_at"])
+            for job in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+                del self._jobs[job["id"]]
+            data = json.dumps(list(self._jobs.values()), indent=2, ensure_ascii=False)
+            self._last_save = time.monotonic()
+            tmp_path = self.jobs_file.with_suffix(".tmp")
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.jobs_file)
+            except IOError:
+                pass
+
+    def _update(self, job_id: str, save: bool = True, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if save or time.monotonic() - self._last_save >= PROGRESS_SAVE_INTERVAL:
+                self._save()
+
+    # ---- public API ----
+    def submit(
+        self,
+        script: str,
+        topic: Optional[str] = None,
+        options: Optional[Dict] = None,
+        secrets: Optional[Dict] = None,
+    ) -> Dict:
+        """Queue a render and return its job record.
+
+        Args:
+            script: The dialogue script to render
+            topic: Show topic, kept with the job for display
+            options: JSON-serializable render options (pause_duration_ms,
+                bg_music_volume_db, bg_music_path, render_key)
+            secrets: API keys for this render; held in memory, never persisted
+        """
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "topic": topic,
+            "script": script,
+            "options": options or {},
+            "status": QUEUED,
+            "progress": 0.0,
+            "message": "Waiting for a free worker",
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            # Whether the job needs the secrets passed here (they aren't persisted)
+            "uses_own_keys": bool(secrets),
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            if secrets:
+                self._secrets[job["id"]] = secrets
+            self._save()
+        self._queue.put(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a snapshot of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return job snapshots, newest first."""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j["created_at"], reverse=True)
+            jobs = [dict(job) for job in jobs]
+        return jobs[:limit] if limit else jobs
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place of a queued job in line, or None if it isn't queued."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != QUEUED:
+                return None
+            return 1 + sum(
+                1 for j in self._jobs.values()
+                if j["status"] == QUEUED and j["created_at"] < job["created_at"]
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that hasn't started yet."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != QUEUED:
+                return False
+            self._secrets.pop(job_id, None)
+            self._update(job_id, status=CANCELLED, message="Cancelled", finished_at=datetime.now().isoformat())
+            return True
+
+    def mark_saved(self, job_id: str, show: Dict) -> Optional[Dict]:
+        """Record that a finished job's show was saved to history.
+
+        Saving moves the audio into the library, so the job's result is
+        pointed at the library copy; a reconnected tab then still finds it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or not job.get("result"):
+                return None
+            result = dict(job["result"], audio_file=show["audio_file"], show_id=show["id"])
+            self._update(job_id, result=result)
+            return dict(job)
+
+    # ---- workers ----
+    def start(self):
+        """Start the worker threads (no-op if already running)."""
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"render-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the jobs they are running finish."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if not job or job["status"] != QUEUED:
+                    continue
+                secrets = self._secrets.pop(job_id, {})
+                self._update(job_id, status=RUNNING, message="Starting", started_at=datetime.now().isoformat())
+                snapshot = dict(job)
+
+            def progress_callback(msg, job_id=job_id):
+                fraction = parse_progress(msg)
+                fields = {"message": msg}
+                if fraction is not None:
+                    fields["progress"] = fraction
+                self._update(job_id, save=False, **fields)
+
+            try:
+                result = self.runner(snapshot, progress_callback, secrets)
+            except Exception as e:
+                self._update(
+                    job_id, status=FAILED, error=str(e), message=f"Failed: {e}",
+                    finished_at=datetime.now().isoformat()
+                )
+            else:
+                self._update(
+                    job_id, status=DONE, progress=1.0, result=result, message="Radio show complete",
+                    finished_at=datetime.now().isoformat()
+                )
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> RenderJobQueue:
+    """Process-wide job queue shared by every app session."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = RenderJobQueue()
+        return _job_queue
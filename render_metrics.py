@@ -0,0 +1,307 @@
+"""
+Render Metrics
+Per-stage timing and resource events for the render pipeline
+
+Each render gets a RenderMetrics that records one event per stage (parse,
+every TTS call, decode, concat, background decode, mix, export). Events are
+forwarded to pluggable sinks, e.g. a JSON-lines log or a Prometheus text
+endpoint, and summarized per render for the show history.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# The metrics endpoint has no authentication, so by default only this machine
+# can scrape it. Set RADIO_AI_METRICS_HOST=0.0.0.0 to expose it to others.
+METRICS_HOST = os.getenv("RADIO_AI_METRICS_HOST", "127.0.0.1")
+# Upper bounds (seconds) of the Prometheus stage-duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Highest resident set size this process has ever had, in MB.
+
+    A lifetime high-water mark that never goes down, so it describes the
+    process (e.g. a whole benchmark run), not any one render or stage.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process right now in MB, if the platform reports it."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+# ===============================
+# SINKS
+# ===============================
+class JsonLogSink:
+    """Appends every event, and each render's summary, as one JSON line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def emit(self, event: Dict):
+        self._write({"type": "stage", **event})
+
+    def render_finished(self, summary: Dict):
+        self._write({"type": "render", **summary})
+
+
+class PrometheusSink:
+    """Aggregates events into Prometheus metrics, exposed in the text format.
+
+    Call `serve(port)` to expose them at http://<host>:<port>/metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_count = {}
+        self._stage_seconds = {}
+        self._stage_bytes = {}
+        self._stage_chars = {}
+        self._stage_buckets = {}
+        self._renders = {"ok": 0, "error": 0}
+        self._rss_mb = None
+
+    def emit(self, event: Dict):
+        stage = event["stage"]
+        with self._lock:
+            self._stage_count[stage] = self._stage_count.get(stage, 0) + 1
+            self._stage_seconds[stage] = self._stage_seconds.get(stage, 0.0) + event["duration_s"]
+            self._stage_bytes[stage] = self._stage_bytes.get(stage, 0) + (event.get("bytes") or 0)
+            self._stage_chars[stage] = self._stage_chars.get(stage, 0) + (event.get("chars") or 0)
+            buckets = self._stage_buckets.setdefault(stage, [0] * len(DURATION_BUCKETS))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if event["duration_s"] <= bound:
+                    buckets[i] += 1
+            if event.get("rss_mb"):
+                self._rss_mb = event["rss_mb"]
+
+    def render_finished(self, summary: Dict):
+        with self._lock:
+            self._renders[summary.get("status", "ok")] = self._renders.get(summary.get("status", "ok"), 0) + 1
+
+    def render_text(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# HELP radio_render_total Finished renders by status.")
+            lines.append("# TYPE radio_render_total counter")
+            for status, count in sorted(self._renders.items()):
+                lines.append(f'radio_render_total{{status="{status}"}} {count}')
+
+            lines.append("# HELP radio_render_stage_seconds Time spent per render stage.")
+            lines.append("# TYPE radio_render_stage_seconds histogram")
+            for stage in sorted(self._stage_count):
+                for bound, count in zip(DURATION_BUCKETS, self._stage_buckets[stage]):
+                    lines.append(f'radio_render_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'radio_render_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {self._stage_count[stage]}')
+                lines.append(f'radio_render_stage_seconds_sum{{stage="{stage}"}} {self._stage_seconds[stage]:.6f}')
+                lines.append(f'radio_render_stage_seconds_count{{stage="{stage}"}} {self._stage_count[stage]}')
+
+            lines.append("# HELP radio_render_stage_bytes_total Bytes produced per render stage.")
+            lines.append("# TYPE radio_render_stage_bytes_total counter")
+            for stage in sorted(self._stage_bytes):
+                lines.append(f'radio_render_stage_bytes_total{{stage="{stage}"}} {self._stage_bytes[stage]}')
+
+            lines.append("# HELP radio_render_stage_chars_total Characters processed per render stage.")
+            lines.append("# TYPE radio_render_stage_chars_total counter")
+            for stage in sorted(self._stage_chars):
+                lines.append(f'radio_render_stage_chars_total{{stage="{stage}"}} {self._stage_chars[stage]}')
+
+            if self._rss_mb is not None:
+                lines.append("# HELP radio_process_rss_megabytes Resident memory after the latest render stage.")
+                lines.append("# TYPE radio_process_rss_megabytes gauge")
+                lines.append(f"radio_process_rss_megabytes {self._rss_mb:.1f}")
+        peak = peak_rss_mb()
+        if peak is not None:
+            lines.append("# HELP radio_process_peak_rss_megabytes Highest resident memory since the process started.")
+            lines.append("# TYPE radio_process_peak_rss_megabytes gauge")
+            lines.append(f"radio_process_peak_rss_megabytes {peak:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+        """Expose /metrics on a background thread."""
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+_default_sinks = None
+_default_sinks_lock = threading.Lock()
+
+
+def get_default_sinks() -> List:
+    """Build the process-wide sinks from the environment, once.
+
+    RADIO_AI_METRICS_LOG: path of a JSON-lines file to append events to
+    RADIO_AI_METRICS_PORT: port to serve Prometheus metrics on
+    RADIO_AI_METRICS_HOST: interface to serve them on (default: 127.0.0.1)
+    """
+    global _default_sinks
+    with _default_sinks_lock:
+        if _default_sinks is None:
+            sinks = []
+            if os.getenv("RADIO_AI_METRICS_LOG"):
+                sinks.append(JsonLogSink(os.getenv("RADIO_AI_METRICS_LOG")))
+            if os.getenv("RADIO_AI_METRICS_PORT"):
+                prometheus = PrometheusSink()
+                try:
+                    prometheus.serve(int(os.getenv("RADIO_AI_METRICS_PORT")))
+                    sinks.append(prometheus)
+                except OSError:
+                    # Port already taken (e.g. a second app process); skip the endpoint
+                    pass
+            _default_sinks = sinks
+        return _default_sinks
+
+
+# ===============================
+# PER-RENDER COLLECTOR
+# ===============================
+class RenderMetrics:
+    """Collects stage events for one render and forwards them to sinks.
+
+    Thread-safe, so TTS workers can record their own calls.
+
+    Args:
+        render_id: ID attached to every event (default: random)
+        sinks: Sinks to forward events to (default: get_default_sinks())
+    """
+
+    def __init__(self, render_id: Optional[str] = None, sinks: Optional[List] = None):
+        self.render_id = render_id or uuid.uuid4().hex[:12]
+        self.sinks = get_default_sinks() if sinks is None else sinks
+        self.events = []
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def record(self, stage: str, duration_s: float, bytes: int = 0, chars: int = 0, **fields):
+        """Record one finished stage, with the process's current resident memory."""
+        rss = current_rss_mb()
+        event = {
+            "render_id": self.render_id,
+            "stage": stage,
+            "duration_s": round(duration_s, 6),
+            "bytes": bytes,
+            "chars": chars,
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            **fields,
+        }
+        with self._lock:
+            self.events.append(event)
+        for sink in self.sinks:
+            sink.emit(event)
+
+    @contextmanager
+    def stage(self, stage: str, **fields):
+        """Time the enclosed block as one stage.
+
+        Yields a dict; set "bytes", "chars" or other fields on it inside
+        the block to attach them to the event. The event also gets
+        rss_delta_mb, the change in resident memory across the block.
+        """
+        info = dict(fields)
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield info
+        finally:
+            rss_after = current_rss_mb()
+            if rss_before is not None and rss_after is not None:
+                info.setdefault("rss_delta_mb", round(rss_after - rss_before, 1))
+            self.record(stage, time.perf_counter() - started, **info)
+
+    def summary(self, status: str = "ok") -> Dict:
+        """Per-stage totals for this render, suitable for show-history metadata."""
+        with self._lock:
+            events = list(self.events)
+        stages = {}
+        for event in events:
+            totals = stages.setdefault(event["stage"], {"count": 0, "duration_s": 0.0, "bytes": 0, "chars": 0})
+            totals["count"] += 1
+            totals["duration_s"] += event["duration_s"]
+            totals["bytes"] += event["bytes"] or 0
+            totals["chars"] += event["chars"] or 0
+            if event.get("rss_delta_mb") is not None:
+                totals["max_rss_delta_mb"] = max(totals.get("max_rss_delta_mb", event["rss_delta_mb"]), event["rss_delta_mb"])
+        for totals in stages.values():
+            totals["duration_s"] = round(totals["duration_s"], 3)
+        samples = [e["rss_mb"] for e in events if e.get("rss_mb")]
+        return {
+            "render_id": self.render_id,
+            "status": status,
+            "started_at": self.started_at,
+            "total_s": round(time.perf_counter() - self._started, 3),
+            # Highest RSS sampled at the end of this render's stages
+            "max_rss_mb": max(samples) if samples else None,
+            "stages": stages,
+        }
+
+    def finish(self, status: str = "ok") -> Dict:
+        """Close the render, send its summary to the sinks and return it."""
+        summary = self.summary(status)
+        with self._lock:
+            if self._finished:
+                return summary
+            self._finished = True
+        for sink in self.sinks:
+            sink.render_finished(summary)
+        return summary
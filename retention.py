@@ -0,0 +1,276 @@
+"""
+Retention
+Disk budget and age policy for generated audio
+
+Apart from the show library, everything under Audios/ can be regenerated:
+job workspaces, render manifests, the TTS clip cache, show outputs that
+were never saved, and uploaded background music. A background sweeper
+deletes the least recently used of those to keep the directory under a
+byte budget. Intermediates go first and outputs after. Anything older
+than the age limit is removed as well. Audio that a history entry points
+at is never deleted.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from engine import AUDIO_PATH, CLIP_CACHE, WORKSPACE_MAX_AGE_S
+from tts_cache import ClipCache
+
+logger = logging.getLogger(__name__)
+
+# Total size allowed for Audios/, library included
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_MB", "2048")) * 1024 * 1024
+# Unused intermediates and outputs older than this are removed even under budget (0 = never)
+RETENTION_MAX_AGE_S = float(os.getenv("RETENTION_MAX_AGE_DAYS", "14")) * 24 * 60 * 60
+# Files used more recently than this may still be needed by a render or session
+RETENTION_MIN_AGE_S = float(os.getenv("RETENTION_MIN_AGE_MIN", "30")) * 60
+RETENTION_INTERVAL_S = float(os.getenv("RETENTION_INTERVAL_S", "600"))
+# Deletions per pass; the sweeper pauses between passes so it never hogs the disk
+RETENTION_BATCH = 50
+RETENTION_PAUSE_S = 0.05
+
+# (name, directory under Audios/, tier, minimum age). Lower tiers are
+# evicted first. "dir" units are removed as a whole, since their files
+# are only useful together. The library is counted but never evicted.
+CATEGORIES = [
+    {"name": "workspaces", "subdir": "jobs", "tier": 0, "unit": "dir", "min_age_s": WORKSPACE_MAX_AGE_S},
+    {"name": "renders", "subdir": "renders", "tier": 0, "unit": "dir"},
+    {"name": "clips", "subdir": "cache", "tier": 0, "unit": "file"},
+    {"name": "shows", "subdir": "shows", "tier": 1, "unit": "file"},
+    {"name": "uploads", "subdir": "uploads", "tier": 1, "unit": "file"},
+    {"name": "other", "subdir": "", "tier": 1, "unit": "file"},
+    {"name": "library", "subdir": "library", "tier": None, "unit": "file"},
+]
+
+
+def referenced_audio() -> set:
+    """Audio files that history entries point at."""
+    from show_history import referenced_audio_files
+    return referenced_audio_files()
+
+
+def _walk_files(path: Path) -> List[tuple]:
+    """(path, bytes, mtime) for every file under path."""
+    found = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            found.append((file_path, stat.st_size, stat.st_mtime))
+    return found
+
+
+class RetentionManager:
+    """Keeps Audios/ within a byte budget and age limit.
+
+    Each sweep scans the audio directory, works out which files (or
+    workspace and render directories) to drop, and deletes them a batch at
+    a time. start() runs sweeps on a daemon thread every interval_s.
+
+    Args:
+        audio_path: Directory holding the generated audio
+        max_bytes: Byte budget for the whole directory
+        max_age_s: Remove evictable units unused for this long (0 = no limit)
+        min_age_s: Never remove units used more recently than this
+        interval_s: Seconds between background sweeps
+        protected: Function returning the paths that must be kept
+            (default: audio referenced by show history)
+        clip_cache: Clip cache whose files are evicted through it, so its
+            size accounting stays right (default: the engine's cache)
+    """
+
+    def __init__(
+        self,
+        audio_path: Path = AUDIO_PATH,
+        max_bytes: int = RETENTION_MAX_BYTES,
+        max_age_s: float = RETENTION_MAX_AGE_S,
+        min_age_s: float = RETENTION_MIN_AGE_S,
+        interval_s: float = RETENTION_INTERVAL_S,
+        protected: Callable[[], set] = referenced_audio,
+        clip_cache: Optional[ClipCache] = CLIP_CACHE,
+    ):
+        self.audio_path = Path(audio_path)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.min_age_s = min_age_s
+        self.interval_s = interval_s
+        self.protected = protected
+        self.clip_cache = clip_cache
+        self._lock = threading.Lock()  # one sweep at a time
+        self._stop = threading.Event()
+        self._thread = None
+        self._usage = None
+        self._last_sweep = None
+
+    # ---- scanning ----
+    def _scan(self):
+        """Return (usage by category, evictable units)."""
+        usage = {c["name"]: {"files": 0, "bytes": 0} for c in CATEGORIES}
+        units = []
+        named = {c["subdir"] for c in CATEGORIES if c["subdir"]}
+        for category in CATEGORIES:
+            root = self.audio_path / category["subdir"]
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if not category["subdir"] and entry.name in named:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    files = _walk_files(Path(entry.path))
+                    if category["unit"] == "dir":
+                        # A directory was last used when its newest file was written
+                        last_used = max((f[2] for f in files), default=entry.stat().st_mtime)
+                        found = [(Path(entry.path), sum(f[1] for f in files), last_used, [f[0] for f in files])]
+                    else:
+                        # Files in subdirectories (e.g. the library's <aa>/ fan-out)
+                        found = [(Path(p), size, mtime, [p]) for p, size, mtime in files]
+                elif entry.is_file(follow_symlinks=False) and category["unit"] == "file":
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found = [(Path(entry.path), stat.st_size, stat.st_mtime, [entry.path])]
+                else:
+                    continue
+                for path, size, last_used, paths in found:
+                    usage[category["name"]]["files"] += len(paths)
+                    usage[category["name"]]["bytes"] += size
+                    if category["tier"] is not None:
+                        units.append({
+                            "path": path, "category": category, "bytes": size, "last_used": last_used,
+                            "paths": paths, "is_dir": category["unit"] == "dir",
+                        })
+        return usage, units
+
+    # ---- policy ----
+    def plan(self, usage: Dict, units: List[Dict], now: Optional[float] = None) -> List[Dict]:
+        """Pick the units to delete: expired ones, then LRU until under budget."""
+        now = time.time() if now is None else now
+        protected = {os.path.realpath(p) for p in self.protected() if p}
+        candidates = []
+        for unit in units:
+            min_age = unit["category"].get("min_age_s", self.min_age_s)
+            if now - unit["last_used"] < max(min_age, self.min_age_s):
+                continue
+            if any(os.path.realpath(p) in protected for p in unit["paths"]):
+                continue
+            candidates.append(unit)
+        candidates.sort(key=lambda u: (u["category"]["tier"], u["last_used"]))
+
+        total = sum(c["bytes"] for c in usage.values())
+        victims = []
+        for unit in candidates:
+            expired = self.max_age_s and now - unit["last_used"] > self.max_age_s
+            if expired or total > self.max_bytes:
+                victims.append(unit)
+                total -= unit["bytes"]
+        return victims
+
+    # ---- sweeping ----
+    def sweep(self, batch_size: int = RETENTION_BATCH, pause_s: float = RETENTION_PAUSE_S) -> Dict:
+        """Run one scan-and-evict pass.
+
+        Returns:
+            Dict with the units deleted, bytes freed, and whether the
+            directory is still over budget (e.g. the library alone exceeds it)
+        """
+        with self._lock:
+            started = time.time()
+            usage, units = self._scan()
+            victims = self.plan(usage, units, now=started)
+            deleted, freed = 0, 0
+            for i, unit in enumerate(victims):
+                if self._stop.is_set():
+                    break
+                if i and i % batch_size == 0:
+                    time.sleep(pause_s)
+                if unit["is_dir"]:
+                    shutil.rmtree(unit["path"], ignore_errors=True)
+                elif not self._remove_file(unit["path"]):
+                    continue
+                usage[unit["category"]["name"]]["files"] -= len(unit["paths"])
+                usage[unit["category"]["name"]]["bytes"] -= unit["bytes"]
+                deleted += 1
+                freed += unit["bytes"]
+            self._usage = usage
+            total = sum(c["bytes"] for c in usage.values())
+            self._last_sweep = {
+                "at": started,
+                "seconds": round(time.time() - started, 3),
+                "deleted": deleted,
+                "freed_bytes": freed,
+                "over_budget": total > self.max_bytes,
+            }
+            return dict(self._last_sweep)
+
+    def _remove_file(self, path: Path) -> bool:
+        """Delete one file, going through the clip cache for its own clips."""
+        cache = self.clip_cache
+        if cache is not None and path.suffix == ".clip" and path.parent.resolve() == cache.cache_dir.resolve():
+            return cache.discard(path.stem)
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+    def usage(self) -> Dict:
+        """Bytes and files per category as of the last sweep (scanning now if none ran yet)."""
+        if self._usage is None:
+            with self._lock:
+                if self._usage is None:
+                    self._usage, _ = self._scan()
+        categories = {name: dict(stats) for name, stats in self._usage.items()}
+        return {
+            "categories": categories,
+            "bytes": sum(c["bytes"] for c in categories.values()),
+            "max_bytes": self.max_bytes,
+            "last_sweep": dict(self._last_sweep) if self._last_sweep else None,
+        }
+
+    # ---- background thread ----
+    def start(self):
+        """Sweep now and then every interval_s on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background thread after the current batch."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Retention sweep failed")
+            self._stop.wait(self.interval_s)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_retention_manager() -> RetentionManager:
+    """Process-wide retention manager, started on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = RetentionManager()
+            _manager.start()
+        return _manager
@@ -0,0 +1,129 @@
+"""
+Script Cache
+On-disk cache of generated radio scripts, with several variants per request
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+SCRIPT_CACHE_DIR = Path(__file__).parent / "cache" / "scripts"
+# Scripts kept per request; "Regenerate" steps through them before asking for new ones
+SCRIPT_CACHE_VARIANTS = int(os.getenv("SCRIPT_CACHE_VARIANTS", "3"))
+SCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", "1000"))
+
+
+def script_key(model: str, temperature: float, prompt_version: int, source_text: str) -> str:
+    """Hash everything that shapes the completion into a cache key."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version,
+            "source_text": source_text,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ScriptCache:
+    """Completion store holding up to max_variants scripts per request key.
+
+    Entries are `<key>.json` files. The least recently used entries are
+    evicted past max_entries. Safe to share between threads.
+
+    Args:
+        cache_dir: Directory for entry files
+        max_variants: Scripts kept per key
+        max_entries: Keys kept in total
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = SCRIPT_CACHE_DIR,
+        max_variants: int = SCRIPT_CACHE_VARIANTS,
+        max_entries: int = SCRIPT_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_variants = max(1, max_variants)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> None, oldest first
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                files.append((path.stat().st_mtime, path.stem))
+            except OSError:
+                continue
+        for _, key in sorted(files):
+            self._entries[key] = None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+
+    def get(self, key: str, variant: int = 0) -> Optional[str]:
+        """Return cached variant number `variant` for key, or None on a miss."""
+        with self._lock:
+            entry = self._read(key) if key in self._entries else None
+            if entry is None or variant >= len(entry["variants"]):
+                self.misses += 1
+                return None
+            os.utime(self._path(key))
+            self._entries[key] = None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["variants"][variant]
+
+    def add(self, key: str, script: str, **info) -> int:
+        """Append a newly generated script to key's variants.
+
+        Extra keyword arguments (model, temperature, ...) are stored with the
+        entry for reference. Returns the variant number it was stored as.
+        """
+        with self._lock:
+            entry = (self._read(key) if key in self._entries else None) or {"variants": [], **info}
+            if len(entry["variants"]) >= self.max_variants:
+                # Full: replace the oldest so the set keeps some freshness
+                entry["variants"].pop(0)
+            entry["variants"].append(script)
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._entries[key] = None
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                try:
+                    self._path(old_key).unlink()
+                except OSError:
+                    pass
+            return len(entry["variants"]) - 1
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_variants": self.max_variants,
+            }
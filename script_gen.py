@@ -0,0 +1,233 @@
+"""
+Script Generation
+Turns a Wikipedia topic into a Hinglish Anjli/Hitesh radio script
+
+Shared by the Streamlit app and the batch CLI.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import wikipedia
+
+from script_cache import ScriptCache, script_key
+from wiki_cache import DISAMBIGUATION, WikiCache
+
+SCRIPT_MODEL = "gpt-4o-mini"
+SCRIPT_TEMPERATURE = 0.8
+WIKI_SENTENCES = 20
+# Bump whenever build_prompt changes, so cached scripts from the old prompt aren't reused
+PROMPT_VERSION = 1
+
+# Regenerating a topic reuses its summary instead of asking Wikipedia again
+WIKI_CACHE = WikiCache()
+# Identical requests (repeat topics, batch re-runs) reuse earlier completions
+SCRIPT_CACHE = ScriptCache()
+
+# Fixed Intro
+INTRO = """Anjli: Hello dosto, welcome to Radio AI! Main hu Anjli.
+Hitesh: Aur main hu Hitesh. Aaj Radio AI par hum baat karenge ek kaafi interesting topic ke baare mein.
+Anjli: Ha yaar, toh bina time waste kiye chalo shuru karte hain aaj ka discussion."""
+
+# Fixed Outro
+OUTRO = """Anjli: Toh dosto, umeed hai aaj ka discussion aapko pasand aaya hoga.
+Hitesh: Agar pasand aaya ho toh Radio AI ke saath jude rahiye, aur aise hi interesting topics ke liye.
+Anjli: Main hu Anjli,
+Hitesh: Aur main hu Hitesh,
+Anjli: Milte hain next episode mein, tab tak ke liye bye bye!"""
+
+
+def fetch_wikipedia_summary(topic_name, sentences=WIKI_SENTENCES, cache=WIKI_CACHE):
+    """Fetch Wikipedia summary, from the cache when possible.
+    
+    Disambiguation pages are cached too and raise DisambiguationError
+    again without a round trip.
+    
+    Args:
+        topic_name: Wikipedia topic
+        sentences: Number of summary sentences
+        cache: WikiCache to read and fill (None always fetches live)
+    """
+    if cache is not None:
+        entry = cache.get(topic_name, sentences)
+        if entry and entry["kind"] == DISAMBIGUATION:
+            raise wikipedia.exceptions.DisambiguationError(entry["title"], entry["options"])
+        if entry:
+            return entry["summary"]
+
+    try:
+        summary = _fetch_live_summary(topic_name, sentences)
+    except wikipedia.exceptions.DisambiguationError as e:
+        if cache is not None:
+            cache.put_disambiguation(topic_name, sentences, e.title, e.options)
+        raise
+    if cache is not None:
+        cache.put_summary(topic_name, sentences, summary)
+    return summary
+
+
+def _fetch_live_summary(topic_name, sentences):
+    """Fetch Wikipedia summary with SSL error handling."""
+    try:
+        # Try normal request first
+        return wikipedia.summary(topic_name, sentences=sentences)
+    except Exception as e:
+        if "SSL" in str(e) or "CERTIFICATE" in str(e) or "certificate verify failed" in str(e):
+            # If SSL error, try with SSL verification disabled
+            # Temporarily disable SSL verification
+            original_get = requests.get
+            def patched_get(*args, **kwargs):
+                kwargs['verify'] = False
+                return original_get(*args, **kwargs)
+            requests.get = patched_get
+            try:
+                result = wikipedia.summary(topic_name, sentences=sentences)
+                return result
+            finally:
+                requests.get = original_get
+        else:
+            raise
+
+
+def prefetch_wikipedia(topics, sentences=WIKI_SENTENCES, max_workers=4, cache=WIKI_CACHE):
+    """Warm the cache for a list of topics ahead of time.
+    
+    Returns:
+        Dict mapping each topic to "ok", or the error that stopped its fetch
+    """
+    def fetch(topic):
+        try:
+            fetch_wikipedia_summary(topic, sentences=sentences, cache=cache)
+            return "ok"
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return dict(zip(topics, pool.map(fetch, topics)))
+
+
+def build_prompt(wiki):
+    """Build the RJ conversation prompt for a Wikipedia summary."""
+    return f"""
+You are a professional Indian FM RJ.
+
+STRICT RULES:
+- EXACTLY 30 lines
+- 15 lines start with Anjli:
+- 15 lines start with Hitesh:
+- CRITICAL: Dialogue MUST alternate in sequence - Start with Anjli, then Hitesh, then Anjli, then Hitesh, and so on
+- The sequence must be: Anjli, Hitesh, Anjli, Hitesh, Anjli, Hitesh... (alternating pattern)
+- Hinglish, casual RJ tone
+- Always use station name "Radio AI"
+- Never use "Radio XYZ"
+- Only dialogue
+- Make it sound like a natural conversation between two hosts
+- NOTE: Intro and Outro will be added automatically, so generate ONLY the main conversation content
+
+Topic:
+{wiki}
+
+Output ONLY the main dialogue in alternating sequence (Anjli, Hitesh, Anjli, Hitesh...). Do NOT include intro or outro.
+"""
+
+
+def generate_dialogue(client, wiki, model=SCRIPT_MODEL, temperature=SCRIPT_TEMPERATURE, variant=0, cache=SCRIPT_CACHE):
+    """Ask the LLM for the main conversation about a Wikipedia summary.
+
+    Completions are cached per (model, temperature, prompt version, source
+    text), several variants each. Asking for variant N below the cache's
+    max_variants returns the cached one if it exists and only calls the LLM
+    otherwise. Variants past that always get a fresh take, which replaces
+    the oldest stored one, so "Regenerate" steps through the stored scripts
+    once and then pays for new ones.
+
+    Args:
+        client: OpenAI client
+        wiki: Wikipedia summary text
+        model: Chat model to use
+        temperature: Sampling temperature
+        variant: Which variant to return (0 = first, increase to regenerate)
+        cache: ScriptCache to read and fill (None always calls the LLM)
+
+    Returns:
+        The main dialogue, without intro or outro
+    """
+    if cache is not None:
+        key = script_key(model, temperature, PROMPT_VERSION, wiki)
+        cached = cache.get(key, variant) if variant < cache.max_variants else None
+        if cached is not None:
+            return cached
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": build_prompt(wiki)}],
+        temperature=temperature
+    )
+    main_script = response.choices[0].message.content.strip()
+    if cache is not None:
+        cache.add(key, main_script, model=model, temperature=temperature, prompt_version=PROMPT_VERSION)
+    return main_script
+
+
+def stream_dialogue_lines(client, wiki, model=SCRIPT_MODEL, temperature=SCRIPT_TEMPERATURE, cache=SCRIPT_CACHE):
+    """Like generate_dialogue, but yield each complete line as the LLM writes it.
+
+    The completion is streamed and split on newlines as tokens arrive, so a
+    consumer (e.g. TTS) can start on the first line while the rest is still
+    being generated. A cached first variant is replayed instead of calling
+    the LLM, and a fresh completion is added to the cache once it finishes.
+
+    Yields:
+        Non-empty, stripped lines of the main dialogue
+    """
+    if cache is not None:
+        key = script_key(model, temperature, PROMPT_VERSION, wiki)
+        cached = cache.get(key, 0)
+        if cached is not None:
+            yield from (line.strip() for line in cached.split("\n") if line.strip())
+            return
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": build_prompt(wiki)}],
+        temperature=temperature,
+        stream=True
+    )
+    text = ""
+    pending = ""
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        text += delta
+        pending += delta
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            if line.strip():
+                yield line.strip()
+    if pending.strip():
+        yield pending.strip()
+
+    if cache is not None:
+        cache.add(key, text.strip(), model=model, temperature=temperature, prompt_version=PROMPT_VERSION)
+
+
+def stream_script_lines(client, wiki, model=SCRIPT_MODEL, temperature=SCRIPT_TEMPERATURE, cache=SCRIPT_CACHE):
+    """Yield the full script line by line: intro, streamed dialogue, outro."""
+    yield from INTRO.split("\n")
+    yield from stream_dialogue_lines(client, wiki, model=model, temperature=temperature, cache=cache)
+    yield from OUTRO.split("\n")
+
+
+def assemble_script(main_script):
+    """Combine intro + main script + outro."""
+    return f"{INTRO}\n\n{main_script}\n\n{OUTRO}"
+
+
+def generate_script(client, topic_name, sentences=WIKI_SENTENCES, model=SCRIPT_MODEL, temperature=SCRIPT_TEMPERATURE):
+    """Fetch a topic from Wikipedia and write the full radio script for it.
+
+    Raises wikipedia's DisambiguationError / PageError for unknown or
+    ambiguous topics.
+    """
+    wiki = fetch_wikipedia_summary(topic_name, sentences=sentences)
+    return assemble_script(generate_dialogue(client, wiki, model=model, temperature=temperature))
@@ -0,0 +1,188 @@
+"""
+Search Index
+Inverted index over show topics and scripts, stored in the history database
+
+Every show's topic and script are tokenized into per-term postings when it
+is saved and removed again when it is deleted, inside the same transaction
+as the show itself. Queries only touch the postings of their own terms and
+rank shows with BM25, so search time depends on how common the query words
+are rather than on the size of the library.
+"""
+import math
+import re
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_terms (
+    term TEXT PRIMARY KEY,
+    doc_count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_postings (
+    term TEXT NOT NULL,
+    show_id INTEGER NOT NULL,
+    tf REAL NOT NULL,
+    PRIMARY KEY (term, show_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_postings_show ON search_postings (show_id);
+CREATE TABLE IF NOT EXISTS search_docs (
+    show_id INTEGER PRIMARY KEY,
+    length REAL NOT NULL
+);
+"""
+
+# A topic word counts as much as this many script words
+TOPIC_WEIGHT = 3.0
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Terms in more than this share of shows (e.g. the hosts' names) only
+# rank results; they don't pull in candidates on their own
+COMMON_TERM_SHARE = 0.5
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+PHRASE_RE = re.compile(r'"([^"]+)"')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens of two or more characters."""
+    return [token for token in TOKEN_RE.findall(text.casefold()) if len(token) > 1]
+
+
+def create_schema(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def index_show(conn: sqlite3.Connection, show_id: int, topic: str, script: str):
+    """Add one show's postings. Call inside the transaction that saves it."""
+    weights = Counter()
+    for token in tokenize(script or ""):
+        weights[token] += 1.0
+    for token in tokenize(topic or ""):
+        weights[token] += TOPIC_WEIGHT
+    if not weights:
+        return
+    conn.executemany(
+        "INSERT INTO search_postings (term, show_id, tf) VALUES (?, ?, ?)",
+        [(term, show_id, tf) for term, tf in weights.items()],
+    )
+    conn.executemany(
+        "INSERT INTO search_terms (term, doc_count) VALUES (?, 1) "
+        "ON CONFLICT (term) DO UPDATE SET doc_count = doc_count + 1",
+        [(term,) for term in weights],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO search_docs (show_id, length) VALUES (?, ?)",
+        (show_id, sum(weights.values())),
+    )
+
+
+def unindex_show(conn: sqlite3.Connection, show_id: int):
+    """Remove one show's postings. Call inside the transaction that deletes it."""
+    terms = [row[0] for row in conn.execute("SELECT term FROM search_postings WHERE show_id = ?", (show_id,))]
+    conn.executemany("UPDATE search_terms SET doc_count = doc_count - 1 WHERE term = ?", [(t,) for t in terms])
+    conn.executemany("DELETE FROM search_terms WHERE term = ? AND doc_count <= 0", [(t,) for t in terms])
+    conn.execute("DELETE FROM search_postings WHERE show_id = ?", (show_id,))
+    conn.execute("DELETE FROM search_docs WHERE show_id = ?", (show_id,))
+
+
+def clear_index(conn: sqlite3.Connection):
+    """Drop every posting."""
+    conn.execute("DELETE FROM search_postings")
+    conn.execute("DELETE FROM search_terms")
+    conn.execute("DELETE FROM search_docs")
+
+
+def rebuild_index(conn: sqlite3.Connection):
+    """Index every show from scratch (used once for databases that predate search)."""
+    clear_index(conn)
+    for show_id, topic, script in conn.execute("SELECT id, topic, script FROM shows").fetchall():
+        index_show(conn, show_id, topic, script)
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+    """Rank shows for a query.
+
+    Words are matched through the index and scored with BM25; "quoted
+    phrases" must also appear verbatim (case-insensitively) in the topic
+    or script.
+
+    Returns:
+        (show_id, score) pairs, best first
+    """
+    phrases = [p.casefold().strip() for p in PHRASE_RE.findall(query) if p.strip()]
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    doc_count, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM search_docs").fetchone()
+    if not doc_count:
+        return []
+    avg_length = total_length / doc_count
+
+    placeholders = ",".join("?" * len(terms))
+    frequencies = dict(conn.execute(
+        f"SELECT term, doc_count FROM search_terms WHERE term IN ({placeholders})", terms
+    ).fetchall())
+    phrase_terms = list(dict.fromkeys(tokenize(" ".join(phrases))))
+    if any(t not in frequencies for t in phrase_terms):
+        # A phrase word that no show contains can't match; plain words stay optional
+        return []
+    matched = [t for t in terms if t in frequencies]
+    if not matched:
+        return []
+
+    rare = [t for t in matched if frequencies[t] <= doc_count * COMMON_TERM_SHARE] or matched
+    if phrase_terms:
+        # Every match contains the phrase, so its rarest word reaches them all
+        rarest = min(phrase_terms, key=lambda t: frequencies[t])
+        if rarest not in rare:
+            rare.append(rarest)
+    scores: Dict[int, float] = {}
+    for term in rare:
+        idf = _idf(doc_count, frequencies[term])
+        for show_id, tf, length in conn.execute(
+            "SELECT p.show_id, p.tf, d.length FROM search_postings p "
+            "JOIN search_docs d ON d.show_id = p.show_id WHERE p.term = ?",
+            (term,),
+        ):
+            scores[show_id] = scores.get(show_id, 0.0) + _bm25(tf, length, avg_length, idf)
+
+    # Common terms only adjust the scores of shows already found
+    for term in matched:
+        if term in rare or not scores:
+            continue
+        idf = _idf(doc_count, frequencies[term])
+        ids = list(scores)
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            for show_id, tf, length in conn.execute(
+                f"SELECT p.show_id, p.tf, d.length FROM search_postings p "
+                f"JOIN search_docs d ON d.show_id = p.show_id "
+                f"WHERE p.term = ? AND p.show_id IN ({','.join('?' * len(batch))})",
+                (term, *batch),
+            ):
+                scores[show_id] += _bm25(tf, length, avg_length, idf)
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    if not phrases:
+        return ranked[:limit]
+
+    results = []
+    for show_id, score in ranked:
+        row = conn.execute("SELECT topic, script FROM shows WHERE id = ?", (show_id,)).fetchone()
+        text = f"{row[0]}\n{row[1]}".casefold() if row else ""
+        if all(phrase in text for phrase in phrases):
+            results.append((show_id, score))
+            if len(results) >= limit:
+                break
+    return results
+
+
+def _idf(doc_count: int, term_docs: int) -> float:
+    return math.log(1 + (doc_count - term_docs + 0.5) / (term_docs + 0.5))
+
+
+def _bm25(tf: float, length: float, avg_length: float, idf: float) -> float:
+    return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
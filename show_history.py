@@ -1,88 +1,293 @@
 """
 Show History Management
 Stores and retrieves generated radio shows
+
+Shows live in a SQLite database (show_history.db) with an index on
+created_at; every write is a single transaction, so concurrent app
+sessions and batch runs can't lose each other's entries. An existing
+show_history.json is imported once, on first use. Topics and scripts are
+kept in a full-text search index (see search_index.py), and saved audio
+in a deduplicating, reference-counted store (see library_store.py), both
+updated in the same transactions.
 """
 import json
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
 
+import library_store
+import search_index
+
+HISTORY_DB = Path(__file__).parent / "show_history.db"
+# Legacy JSON history, migrated into HISTORY_DB the first time it is opened
 HISTORY_FILE = Path(__file__).parent / "show_history.json"
 
-def load_history() -> List[Dict]:
-    """Load show history from JSON file."""
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    script TEXT NOT NULL,
+    audio_file TEXT,
+    created_at TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_shows_created_at ON shows (created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+def _open() -> sqlite3.Connection:
+    conn = sqlite3.connect(str(HISTORY_DB), timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@contextmanager
+def _connect():
+    """Open the history database, creating and migrating it on first use.
+
+    Everything done on the yielded connection commits as one transaction,
+    or rolls back if the block raises.
+    """
+    db_path = str(HISTORY_DB)
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                _init_db()
+                _initialized.add(db_path)
+    conn = _open()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _init_db():
+    conn = _open()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        search_index.create_schema(conn)
+        library_store.create_schema(conn)
+        with conn:
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if not migrated:
+                _migrate_json(conn)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+            indexed = conn.execute("SELECT value FROM meta WHERE key = 'search_indexed'").fetchone()
+            if not indexed:
+                # History saved before search existed
+                search_index.rebuild_index(conn)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('search_indexed', ?)", (datetime.now().isoformat(),))
+    finally:
+        conn.close()
+
+def _migrate_json(conn: sqlite3.Connection):
+    """Copy shows from the legacy JSON file, keeping their IDs."""
     if not HISTORY_FILE.exists():
-        return []
+        return
     try:
         with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            history = json.load(f)
     except (json.JSONDecodeError, IOError):
-        return []
+        return
+    # Old IDs were len(history) + 1 and could repeat after deletes. Shows
+    # keeping their ID go in first, so the new IDs given to repeats can't
+    # collide with a later show's original one.
+    seen, repeats = set(), []
+    for show in history:
+        show_id = show.get("id")
+        if show_id is None or show_id in seen:
+            repeats.append(show)
+            continue
+        seen.add(show_id)
+        _insert(conn, show, show_id)
+    for show in repeats:
+        _insert(conn, show)
+    HISTORY_FILE.rename(HISTORY_FILE.with_suffix(".json.migrated"))
+
+def _insert(conn: sqlite3.Connection, show: Dict, show_id: Optional[int] = None) -> int:
+    cursor = conn.execute(
+        "INSERT INTO shows (id, topic, script, audio_file, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            show_id,
+            show.get("topic") or "Untitled",
+            show.get("script") or "",
+            show.get("audio_file"),
+            show.get("created_at") or datetime.now().isoformat(),
+            json.dumps(show.get("metadata") or {}, ensure_ascii=False),
+        ),
+    )
+    search_index.index_show(conn, cursor.lastrowid, show.get("topic") or "Untitled", show.get("script") or "")
+    return cursor.lastrowid
+
+def _row_to_show(row: sqlite3.Row) -> Dict:
+    return {
+        "id": row["id"],
+        "topic": row["topic"],
+        "script": row["script"],
+        "audio_file": row["audio_file"],
+        "created_at": row["created_at"],
+        "metadata": json.loads(row["metadata"]),
+    }
+
+def load_history() -> List[Dict]:
+    """Load the whole show history, oldest first."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM shows ORDER BY created_at, id").fetchall()
+    return [_row_to_show(row) for row in rows]
 
 def save_history(history: List[Dict]):
-    """Save show history to JSON file."""
-    try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
-    except IOError:
-        pass
+    """Replace the whole show history in one transaction."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM shows")
+        search_index.clear_index(conn)
+        for show in history:
+            _insert(conn, show, show.get("id"))
+        library_store.collect_garbage(conn)
 
-def add_show(topic: str, script: str, audio_file: str, metadata: Optional[Dict] = None) -> Dict:
+def add_show(topic: str, script: str, audio_file: str, metadata: Optional[Dict] = None, move_audio: bool = True) -> Dict:
     """Add a new show to history.
-    
+
+    The audio file is moved into the content-addressed library, and the
+    entry points at the library copy.
+
     Args:
         topic: The topic of the show
         script: The script text
         audio_file: Path to the audio file
         metadata: Optional additional metadata
-        
+        move_audio: Move the audio into the library (False copies it)
+
     Returns:
         The created show entry
     """
-    history = load_history()
-    
+    # Hash before taking the write lock; large files shouldn't block other writers
+    digest = library_store.file_digest(audio_file) if audio_file and Path(audio_file).is_file() else None
+
     show_entry = {
-        "id": len(history) + 1,
         "topic": topic,
         "script": script,
         "audio_file": audio_file,
         "created_at": datetime.now().isoformat(),
         "metadata": metadata or {}
     }
-    
-    history.append(show_entry)
-    save_history(history)
-    return show_entry
+
+    with _connect() as conn:
+        # Write-lock first, so garbage collection can't run between storing and referencing the file
+        conn.execute("BEGIN IMMEDIATE")
+        if digest:
+            show_entry["audio_file"] = library_store.store(conn, audio_file, digest, move=move_audio)
+        show_id = _insert(conn, show_entry)
+    return {"id": show_id, **show_entry}
 
 def get_show(show_id: int) -> Optional[Dict]:
     """Get a specific show by ID."""
-    history = load_history()
-    for show in history:
-        if show.get("id") == show_id:
-            return show
-    return None
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM shows WHERE id = ?", (show_id,)).fetchone()
+    return _row_to_show(row) if row else None
 
 def get_all_shows(limit: Optional[int] = None) -> List[Dict]:
     """Get all shows, optionally limited to most recent N."""
-    history = load_history()
-    # Return in reverse chronological order (newest first)
-    history.reverse()
+    query = "SELECT * FROM shows ORDER BY created_at DESC, id DESC"
+    params = ()
     if limit:
-        return history[:limit]
-    return history
+        query += " LIMIT ?"
+        params = (limit,)
+    with _connect() as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [_row_to_show(row) for row in rows]
+
+def count_shows() -> int:
+    """Number of shows in history."""
+    with _connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM shows").fetchone()[0]
+
+def get_shows_page(offset: int = 0, limit: int = 20, include_script: bool = False) -> List[Dict]:
+    """Get one page of shows, newest first.
+
+    Args:
+        offset: Number of newer shows to skip
+        limit: Maximum shows to return
+        include_script: Also load each script (left out by default, since
+            listings only need topic, date and audio path)
+
+    Returns:
+        Show entries; without include_script their "script" is None
+    """
+    columns = "*" if include_script else "id, topic, NULL AS script, audio_file, created_at, metadata"
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT {columns} FROM shows ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+    return [_row_to_show(row) for row in rows]
+
+def search_shows(query: str, limit: int = 20) -> List[Dict]:
+    """Find shows whose topic or script matches a query, best match first.
+
+    Words are looked up in the search index and ranked (topic matches count
+    extra); "quoted phrases" must appear verbatim.
+
+    Returns:
+        Show entries without their script, each with a "score" and a short
+        "snippet" of the script around the first match
+    """
+    with _connect() as conn:
+        ranked = search_index.search(conn, query, limit)
+        shows = []
+        for show_id, score in ranked:
+            row = conn.execute("SELECT * FROM shows WHERE id = ?", (show_id,)).fetchone()
+            if row is None:
+                continue
+            show = _row_to_show(row)
+            show["snippet"] = _snippet(show["script"], query)
+            show["script"] = None
+            show["score"] = round(score, 3)
+            shows.append(show)
+    return shows
+
+def _snippet(script: str, query: str, width: int = 160) -> str:
+    """A line's worth of script around the first query word found in it."""
+    lowered = script.casefold()
+    positions = [lowered.find(token) for token in search_index.tokenize(query)]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 4) if positions else 0
+    snippet = script[start:start + width].replace("\n", " ")
+    return ("…" if start else "") + snippet + ("…" if start + width < len(script) else "")
 
 def delete_show(show_id: int) -> bool:
     """Delete a show from history."""
-    history = load_history()
-    original_length = len(history)
-    history = [show for show in history if show.get("id") != show_id]
-    
-    if len(history) < original_length:
-        save_history(history)
-        return True
-    return False
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT audio_file FROM shows WHERE id = ?", (show_id,)).fetchone()
+        if row is None:
+            return False
+        search_index.unindex_show(conn, show_id)
+        conn.execute("DELETE FROM shows WHERE id = ?", (show_id,))
+        library_store.release(conn, row["audio_file"])
+    return True
 
 def clear_history():
     """Clear all show history."""
-    save_history([])
+    with _connect() as conn:
+        conn.execute("DELETE FROM shows")
+        search_index.clear_index(conn)
+        library_store.collect_garbage(conn)
+
+def referenced_audio_files() -> set:
+    """Every audio path a show points at (kept by retention cleanup)."""
+    with _connect() as conn:
+        return {row[0] for row in conn.execute("SELECT DISTINCT audio_file FROM shows WHERE audio_file IS NOT NULL")}
 
+def library_usage() -> Dict:
+    """Number of files and bytes in the audio library."""
+    with _connect() as conn:
+        return library_store.usage(conn)
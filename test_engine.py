@@ -3,14 +3,27 @@ Tests for the radio show generation engine.
 """
 import pytest
 import os
+import time
 from pathlib import Path
 from unittest.mock import patch, MagicMock
+from pydub import AudioSegment
 from engine import generate_radio_show_from_script, VOICE_MAP
 
 # Skip tests if API keys are not set (for CI/CD)
 SKIP_TESTS = not os.getenv("ELEVENLABS_API_KEY") and not os.getenv("OPENAI_API_KEY")
 
 
+@pytest.fixture(autouse=True)
+def isolated_audio_dirs(tmp_path_factory):
+    """Keep render workspaces and outputs out of the repo's Audios directory."""
+    audio_path = tmp_path_factory.mktemp("audio")
+    with patch('engine.JOBS_PATH', audio_path / "jobs"), \
+            patch('engine.SHOWS_PATH', audio_path / "shows"), \
+            patch('engine.RENDERS_PATH', audio_path / "renders"), \
+            patch('engine.UPLOADS_PATH', audio_path / "uploads"):
+        yield audio_path
+
+
 def test_script_parsing_basic():
     """Test basic script parsing and audio generation."""
     script = """
@@ -21,17 +34,11 @@ def test_script_parsing_basic():
     
     # Mock the API call to avoid actual API usage in tests
     with patch('engine.generate_audio'):
-        # Create a mock audio file
-        mock_audio = MagicMock()
-        mock_audio.__len__ = lambda x: 1000  # Mock duration
-        mock_audio.__add__ = lambda x, y: mock_audio  # Mock sum() operation
-        mock_audio.__mul__ = lambda x, y: mock_audio  # Mock multiplication
-        mock_audio.__getitem__ = lambda x, y: mock_audio  # Mock slicing
-        mock_audio.overlay = lambda x: mock_audio  # Mock overlay method
-        mock_audio.export = MagicMock()  # Mock export method
+        # Stand in a one second clip for every decoded line
+        mock_audio = AudioSegment.silent(duration=1000)
         
         with patch('pydub.AudioSegment.from_mp3', return_value=mock_audio):
-            with patch('pydub.AudioSegment.silent', return_value=mock_audio):
+            with patch('pydub.AudioSegment.export'):  # Mock export (needs ffmpeg)
                 # Mock Path.exists() - it's called as a method on Path objects
                 # We need to patch it at the Path class level
                 original_exists = Path.exists
@@ -81,16 +88,10 @@ def test_script_parsing_anjli_only():
     """
     
     with patch('engine.generate_audio'):
-        mock_audio = MagicMock()
-        mock_audio.__len__ = lambda x: 1000
-        mock_audio.__add__ = lambda x, y: mock_audio
-        mock_audio.__mul__ = lambda x, y: mock_audio
-        mock_audio.__getitem__ = lambda x, y: mock_audio
-        mock_audio.overlay = lambda x: mock_audio
-        mock_audio.export = MagicMock()
+        mock_audio = AudioSegment.silent(duration=1000)
         
         with patch('pydub.AudioSegment.from_mp3', return_value=mock_audio):
-            with patch('pydub.AudioSegment.silent', return_value=mock_audio):
+            with patch('pydub.AudioSegment.export'):
                 with patch('pathlib.Path.exists', return_value=False):
                     output = generate_radio_show_from_script(script)
                     assert output.endswith(".mp3")
@@ -104,16 +105,10 @@ def test_script_parsing_hitesh_only():
     """
     
     with patch('engine.generate_audio'):
-        mock_audio = MagicMock()
-        mock_audio.__len__ = lambda x: 1000
-        mock_audio.__add__ = lambda x, y: mock_audio
-        mock_audio.__mul__ = lambda x, y: mock_audio
-        mock_audio.__getitem__ = lambda x, y: mock_audio
-        mock_audio.overlay = lambda x: mock_audio
-        mock_audio.export = MagicMock()
+        mock_audio = AudioSegment.silent(duration=1000)
         
         with patch('pydub.AudioSegment.from_mp3', return_value=mock_audio):
-            with patch('pydub.AudioSegment.silent', return_value=mock_audio):
+            with patch('pydub.AudioSegment.export'):
                 with patch('pathlib.Path.exists', return_value=False):
                     output = generate_radio_show_from_script(script)
                     assert output.endswith(".mp3")
@@ -127,24 +122,18 @@ def test_pause_duration_parameter():
     """
     
     with patch('engine.generate_audio'):
-        mock_audio = MagicMock()
-        mock_audio.__len__ = lambda x: 1000
-        mock_audio.__add__ = lambda x, y: mock_audio
-        mock_audio.__mul__ = lambda x, y: mock_audio
-        mock_audio.__getitem__ = lambda x, y: mock_audio
-        mock_audio.overlay = lambda x: mock_audio
-        mock_audio.export = MagicMock()
+        mock_audio = AudioSegment.silent(duration=1000)
         
         with patch('pydub.AudioSegment.from_mp3', return_value=mock_audio):
-            with patch('pydub.AudioSegment.silent') as mock_silent:
-                mock_silent.return_value = mock_audio
+            with patch('pydub.AudioSegment.export', autospec=True) as mock_export:
                 with patch('pathlib.Path.exists', return_value=False):
                     generate_radio_show_from_script(
                         script,
                         pause_duration_ms=1000
                     )
-                    # Verify silent audio was called (for pause)
-                    assert mock_silent.called
+                    # Two 1s lines plus one 1s pause between them
+                    final_audio = mock_export.call_args.args[0]
+                    assert len(final_audio) == 3000
 
 
 def test_bg_music_volume_parameter():
@@ -155,18 +144,10 @@ def test_bg_music_volume_parameter():
     """
     
     with patch('engine.generate_audio'):
-        mock_audio = MagicMock()
-        mock_audio.__len__ = lambda x: 1000
-        mock_audio.__add__ = lambda x, y: mock_audio
-        mock_audio.__mul__ = lambda x, y: mock_audio
-        mock_audio.__getitem__ = lambda x, y: mock_audio
-        mock_audio.overlay = lambda x: mock_audio
-        mock_audio.export = MagicMock()
-        # Mock __add__ for volume adjustment (bg + volume_db)
-        mock_audio.__radd__ = lambda x, y: mock_audio
+        mock_audio = AudioSegment.silent(duration=1000)
         
         with patch('pydub.AudioSegment.from_mp3', return_value=mock_audio):
-            with patch('pydub.AudioSegment.silent', return_value=mock_audio):
+            with patch('pydub.AudioSegment.export'):
                 with patch('pathlib.Path.exists', return_value=False):
                     # Should not raise error with custom volume
                     output = generate_radio_show_from_script(
@@ -180,4 +161,1007 @@ def test_voice_map():
     """Test that voice map contains expected voices."""
     assert "Anjli" in VOICE_MAP
     assert "Hitesh" in VOICE_MAP
-    assert len(VOICE_MAP) == 2
\ No newline at end of file
+    assert len(VOICE_MAP) == 2
+
+def test_synthesize_dialogue_bounded_and_ordered(tmp_path):
+    """Test that TTS runs concurrently within the limit and keeps script order."""
+    import threading
+    import time
+    from engine import synthesize_dialogue
+
+    dialogue = [("Anjli" if i % 2 == 0 else "Hitesh", f"Line {i}") for i in range(8)]
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0}
+
+    def fake_generate_audio(text, voice_id, filename, **kwargs):
+        with lock:
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        # Later lines finish first to scramble completion order
+        time.sleep(0.01 * (8 - int(text.split()[-1])))
+        with lock:
+            state["in_flight"] -= 1
+
+    messages = []
+    with patch('engine.generate_audio', side_effect=fake_generate_audio):
+        filenames = synthesize_dialogue(dialogue, messages.append, max_workers=3, workspace=tmp_path)
+
+    with pytest.raises(ValueError):
+        synthesize_dialogue(dialogue, messages.append)
+
+    assert [Path(f).stem for f in filenames] == [f"{i}_{s}" for i, (s, _) in enumerate(dialogue)]
+    assert 1 < state["peak"] <= 3
+    assert messages == [f"🔊 Voice {n}/8" for n in range(1, 9)]
+
+    # A line repeated within the script is synthesized once and its clip reused
+    repeated = [("Anjli", "Namaste"), ("Hitesh", "Hello"), ("Anjli", "Namaste")]
+    with patch('engine.generate_audio') as generate:
+        filenames = synthesize_dialogue(repeated, messages.append, workspace=tmp_path / "repeats")
+    assert generate.call_count == 2
+    assert [Path(f).stem for f in filenames] == ["0_Anjli", "1_Hitesh", "0_Anjli"]
+
+
+def test_clip_cache_hits_misses_and_lru_eviction(tmp_path):
+    """Test that the clip cache serves repeats and evicts least recently used clips."""
+    from tts_cache import ClipCache, clip_key
+
+    cache = ClipCache(tmp_path / "cache", max_bytes=20)
+    src = tmp_path / "src.mp3"
+    dest = tmp_path / "dest.mp3"
+    key_a = clip_key("voice", "model", "a")
+    key_b = clip_key("voice", "model", "b")
+    key_c = clip_key("voice", "model", "c")
+    assert key_a != clip_key("voice", "model", "a", {"stability": 0.5})
+
+    assert not cache.get(key_a, str(dest))
+    for key, data in ((key_a, b"A" * 8), (key_b, b"B" * 8)):
+        src.write_bytes(data)
+        cache.put(key, str(src))
+
+    assert cache.get(key_a, str(dest))
+    assert dest.read_bytes() == b"A" * 8
+
+    # Adding c overflows the cap; b is now the least recently used
+    src.write_bytes(b"C" * 8)
+    cache.put(key_c, str(src))
+    assert not cache.get(key_b, str(dest))
+    assert cache.get(key_a, str(dest))
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["bytes"] <= 20
+
+
+def test_generate_audio_uses_cache(tmp_path):
+    """Test that a cached line does not call ElevenLabs again."""
+    from engine import generate_audio
+    from tts_cache import ClipCache
+
+    cache = ClipCache(tmp_path / "cache")
+    client = MagicMock()
+    client.text_to_speech.return_value = b"mp3-bytes"
+    for name in ("1.mp3", "2.mp3"):
+        generate_audio(
+            "Hello", "voice", str(tmp_path / name),
+            cache=cache, client=client, stream=False, output_format="mp3_44100_128"
+        )
+
+    assert client.text_to_speech.call_count == 1
+    assert (tmp_path / "2.mp3").read_bytes() == b"mp3-bytes"
+    assert cache.stats()["hits"] == 1
+
+
+def test_tts_client_reuses_pooled_session():
+    """Test that the TTS client sends every request through one pooled session."""
+    from tts_client import ElevenLabsClient
+
+    client = ElevenLabsClient(api_key="key", pool_size=4, timeout=(1, 2))
+    response = MagicMock(status_code=200, content=b"audio")
+    with patch.object(client.session, 'post', return_value=response) as mock_post:
+        assert client.text_to_speech("voice", {"text": "a"}) == b"audio"
+        client.text_to_speech("voice", {"text": "b"}, api_key="other")
+
+    assert mock_post.call_count == 2
+    assert mock_post.call_args.kwargs["headers"]["xi-api-key"] == "other"
+    assert mock_post.call_args.kwargs["timeout"] == (1, 2)
+    assert client.session.get_adapter("https://api.elevenlabs.io")._pool_maxsize == 4
+
+
+def test_tts_client_streams_chunks_to_file(tmp_path):
+    """Test that streamed audio is written chunk by chunk and failed streams leave no clip."""
+    from engine import generate_audio
+    from tts_client import ElevenLabsClient
+
+    client = ElevenLabsClient(api_key="key")
+    response = MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_content.return_value = iter([b"ab", b"", b"cd"])
+    with patch.object(client.session, 'post', return_value=response) as mock_post:
+        generate_audio("Hi", "voice", str(tmp_path / "clip.mp3"), cache=None, client=client, output_format="mp3_44100_128")
+
+    assert mock_post.call_args.args[0].endswith("/v1/text-to-speech/voice/stream")
+    assert mock_post.call_args.kwargs["stream"] is True
+    assert (tmp_path / "clip.mp3").read_bytes() == b"abcd"
+
+    failed = MagicMock(status_code=400, text="boom")
+    failed.__enter__.return_value = failed
+    with patch.object(client.session, 'post', return_value=failed):
+        with pytest.raises(Exception, match="boom"):
+            generate_audio("Hi", "voice", str(tmp_path / "bad.mp3"), cache=None, client=client)
+    assert not (tmp_path / "bad.mp3").exists()
+
+
+def test_rerender_only_synthesizes_changed_lines(tmp_path):
+    """Test that re-rendering an edited script reuses clips of unchanged lines."""
+    from engine import synthesize_dialogue
+
+    def fake_generate_audio(text, voice_id, filename, **kwargs):
+        Path(filename).write_bytes(text.encode())
+
+    original = [("Anjli", "Hello"), ("Hitesh", "Namaste"), ("Anjli", "Bye")]
+    edited = [("Anjli", "Hello"), ("Hitesh", "Namaste dosto"), ("Anjli", "Bye")]
+
+    with patch('engine.RENDERS_PATH', tmp_path):
+        with patch('engine.generate_audio', side_effect=fake_generate_audio) as mock_generate:
+            synthesize_dialogue(original, lambda msg: None, render_key="show1")
+            assert mock_generate.call_count == 3
+
+            mock_generate.reset_mock()
+            filenames = synthesize_dialogue(edited, lambda msg: None, render_key="show1")
+            assert [c.args[0] for c in mock_generate.call_args_list] == ["Namaste dosto"]
+
+    assert [f.read_bytes() for f in filenames] == [b"Hello", b"Namaste dosto", b"Bye"]
+    # The clip for the replaced line is cleaned up
+    assert len(list((tmp_path / "show1").glob("*_*"))) == 3
+
+    with pytest.raises(ValueError):
+        synthesize_dialogue(original, lambda msg: None, render_key="../escape")
+
+
+def test_renders_with_the_same_key_run_one_at_a_time():
+    """Test that a render can't prune clips another render of its key is still using."""
+    import threading
+    from engine import _render_dir_locks, lock_render_dir
+
+    order = []
+    first_inside = threading.Event()
+    release = threading.Event()
+
+    def render(name):
+        with lock_render_dir("show1"):
+            order.append(f"{name} start")
+            first_inside.set()
+            if name == "a":
+                release.wait(5)
+            order.append(f"{name} end")
+
+    first = threading.Thread(target=render, args=("a",))
+    first.start()
+    assert first_inside.wait(5)
+    second = threading.Thread(target=render, args=("b",))
+    second.start()
+    # Other keys aren't held up
+    with lock_render_dir("show2"):
+        pass
+    time.sleep(0.05)
+    assert order == ["a start"]
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert order == ["a start", "a end", "b start", "b end"]
+    assert not _render_dir_locks
+
+
+def test_assemble_timeline_places_clips_and_pauses():
+    """Test that the timeline builder lays clips out with silent gaps in order."""
+    from audio_mix import assemble_timeline
+
+    tone = AudioSegment(data=b"\x10\x00" * 100, sample_width=2, frame_rate=1000, channels=1)
+    other = AudioSegment(data=b"\x20\x00" * 50, sample_width=2, frame_rate=1000, channels=1)
+
+    timeline = assemble_timeline([tone, other, tone], pause_duration_ms=20)
+
+    raw = timeline.raw_data
+    assert len(timeline) == 100 + 20 + 50 + 20 + 100
+    assert raw[:200] == b"\x10\x00" * 100
+    assert raw[200:240] == b"\x00" * 40
+    assert raw[240:340] == b"\x20\x00" * 50
+    assert raw[-200:] == b"\x10\x00" * 100
+
+    with pytest.raises(ValueError):
+        assemble_timeline([])
+
+
+def test_mix_background_loops_and_clips_in_place():
+    """Test that background music is looped under the dialogue with clipping protection."""
+    import numpy as np
+    from audio_mix import mix_background, to_samples
+
+    dialogue = AudioSegment(
+        data=np.array([0, 100, 32000, -32000, 0, 0, 0], dtype=np.int16).tobytes(),
+        sample_width=2, frame_rate=1000, channels=1
+    )
+    background = AudioSegment(
+        data=np.array([1000, 2000], dtype=np.int16).tobytes(),
+        sample_width=2, frame_rate=1000, channels=1
+    )
+
+    with patch('audio_mix.MIX_BLOCK_SAMPLES', 3):
+        mixed = mix_background(dialogue, background, volume_db=0)
+
+    assert list(to_samples(mixed)) == [1000, 2100, 32767, -30000, 1000, 2000, 1000]
+
+    # -20 dB is a tenth of the amplitude
+    quiet = mix_background(AudioSegment.silent(duration=10, frame_rate=1000), background, volume_db=-20)
+    assert list(to_samples(quiet)[:2]) == [100, 200]
+
+
+def test_background_decode_is_cached_until_file_changes(tmp_path):
+    """Test that background music is decoded once per file version and rate."""
+    import os
+    from audio_mix import clear_background_cache, load_background
+
+    music = tmp_path / "bg.mp3"
+    music.write_bytes(b"v1")
+    decoded = AudioSegment.silent(duration=100, frame_rate=1000)
+    clear_background_cache()
+
+    with patch('pydub.AudioSegment.from_mp3', return_value=decoded) as mock_decode:
+        first = load_background(music, 1000)
+        assert load_background(music, 1000) is first
+        assert mock_decode.call_count == 1
+
+        load_background(music, 2000)
+        assert mock_decode.call_count == 2
+
+        music.write_bytes(b"version 2")
+        os.utime(music, (0, 12345))
+        load_background(music, 1000)
+        assert mock_decode.call_count == 3
+
+    with patch('audio_mix.BG_CACHE_MAX_BYTES', 0):
+        clear_background_cache()
+        with patch('pydub.AudioSegment.from_mp3', return_value=decoded) as mock_decode:
+            load_background(music, 1000)
+            load_background(music, 1000)
+            assert mock_decode.call_count == 2
+
+
+def test_progressive_chunks_match_full_render(tmp_path):
+    """Test that streamed chunks arrive in order and add up to the full mixed show."""
+    import numpy as np
+    from engine import stream_radio_show_from_script
+
+    script = """
+    Anjli: Line one
+    Hitesh: Line two
+    Anjli: Line three
+    """
+    clip = AudioSegment(data=np.full(70, 1000, dtype=np.int16).tobytes(), sample_width=2, frame_rate=1000, channels=1)
+    bg = AudioSegment(data=np.arange(1, 33, dtype=np.int16).tobytes(), sample_width=2, frame_rate=1000, channels=1)
+    real_export = AudioSegment.export
+    exported = {"full": None, "chunk_formats": []}
+
+    def fake_export(segment, out_f, format="mp3"):
+        if format == "raw":
+            # Raw PCM is written by pydub itself, no ffmpeg needed
+            return real_export(segment, out_f, format="raw")
+        if isinstance(out_f, str):
+            exported["full"] = bytes(segment.raw_data)
+        else:
+            # Stand-in for an MP3 encode of just this chunk
+            exported["chunk_formats"].append(format)
+            out_f.write(b"ID3" + bytes(segment.raw_data))
+
+    with patch('engine.generate_audio'), \
+            patch('pydub.AudioSegment.from_mp3', return_value=clip), \
+            patch('pydub.AudioSegment.export', fake_export), \
+            patch('engine.resolve_bg_music', return_value=tmp_path / "bg.mp3"), \
+            patch('engine.load_background', return_value=bg):
+        generate_radio_show_from_script(script, pause_duration_ms=20)
+        raw_chunks = list(stream_radio_show_from_script(script, pause_duration_ms=20, chunk_format="raw"))
+        mp3_chunks = list(stream_radio_show_from_script(script, pause_duration_ms=20, segment_dir=tmp_path / "live"))
+
+    # Raw PCM chunks join into exactly the full mix
+    assert [c["index"] for c in raw_chunks] == [0, 1, 2]
+    assert [c["start_ms"] for c in raw_chunks] == [0, 90, 180]
+    assert b"".join(c["data"] for c in raw_chunks) == exported["full"]
+
+    # MP3 chunks are separate files, one encode each, listed in the playlist
+    assert exported["chunk_formats"] == ["mp3", "mp3", "mp3"]
+    assert all(c["data"].startswith(b"ID3") for c in mp3_chunks)
+    assert [Path(c["path"]).read_bytes() for c in mp3_chunks] == [c["data"] for c in mp3_chunks]
+    assert (tmp_path / "live" / "playlist.m3u").read_text().split() == [
+        "#EXTM3U", "segment_000.mp3", "segment_001.mp3", "segment_002.mp3"
+    ]
+
+
+def test_scheduler_retries_throttling_and_adapts_concurrency():
+    """Test that 429s honor Retry-After, shrink concurrency and are retried."""
+    import time
+    from tts_client import TTSError, parse_retry_after
+    from tts_scheduler import TTSScheduler
+
+    scheduler = TTSScheduler(rate=1000, max_concurrency=8, max_retries=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TTSError("slow down", status_code=429, retry_after=0.05)
+        return "audio"
+
+    started = time.monotonic()
+    assert scheduler.call(flaky) == "audio"
+
+    assert len(attempts) == 3
+    assert time.monotonic() - started >= 0.1
+    stats = scheduler.stats()
+    assert stats["throttled"] == 2
+    assert stats["retries"] == 2
+    assert stats["concurrency_limit"] == 2
+    assert stats["in_flight"] == 0
+
+    def bad_request():
+        raise TTSError("invalid voice", status_code=400)
+
+    with pytest.raises(TTSError, match="invalid voice"):
+        scheduler.call(bad_request)
+    assert scheduler.stats()["calls"] == 4
+
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after(None) is None
+
+
+def test_stream_dropped_mid_body_is_retried_from_the_start(tmp_path):
+    """Test that a connection lost partway through a streamed clip is retried."""
+    import requests
+    from engine import generate_audio
+    from tts_scheduler import TTSScheduler
+
+    client = MagicMock()
+    attempts = []
+
+    def stream_text_to_speech(voice_id, payload, out, **kwargs):
+        attempts.append(1)
+        out.write(b"ID3 first half")
+        if len(attempts) == 1:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead")
+        out.write(b" second half")
+
+    client.stream_text_to_speech.side_effect = stream_text_to_speech
+    scheduler = TTSScheduler(rate=1000, base_backoff=0.001)
+    filename = tmp_path / "clip.mp3"
+    generate_audio(
+        "Namaste", "voice", str(filename), cache=None, client=client,
+        stream=True, scheduler=scheduler, output_format="mp3_44100_128"
+    )
+
+    assert len(attempts) == 2
+    assert scheduler.stats()["retries"] == 1
+    # The retry starts the file over instead of appending to the partial body
+    assert filename.read_bytes() == b"ID3 first half second half"
+
+
+def test_pcm_output_is_wrapped_as_wav_and_falls_back_to_mp3(tmp_path):
+    """Test that PCM clips load without ffmpeg and rejected PCM falls back to MP3."""
+    import engine
+    from engine import generate_audio, load_clip
+    from tts_client import TTSError
+
+    client = MagicMock()
+    client.text_to_speech.return_value = b"\x01\x00\x02\x00" * 441
+    wav_file = tmp_path / "clip.wav"
+    generate_audio("Hi", "voice", str(wav_file), cache=None, client=client, stream=False, output_format="pcm_44100")
+
+    assert client.text_to_speech.call_args.kwargs["output_format"] == "pcm_44100"
+    with patch('pydub.AudioSegment.from_mp3') as mock_from_mp3:
+        clip = load_clip(wav_file)
+    assert not mock_from_mp3.called
+    assert (clip.frame_rate, clip.channels, clip.sample_width, len(clip)) == (44100, 1, 2, 20)
+
+    def plan_without_pcm(voice_id, payload, api_key=None, output_format=None):
+        if output_format.startswith("pcm_"):
+            raise TTSError("output format not allowed", status_code=403)
+        return b"mp3-bytes"
+
+    client.text_to_speech.side_effect = plan_without_pcm
+    with patch('engine._pcm_rejected_plans', set()), patch('engine.TTS_OUTPUT_FORMAT', "pcm_44100"):
+        generate_audio("Hi", "voice", str(tmp_path / "fallback.wav"), api_key="sk-basic", cache=None, client=client, stream=False)
+        assert engine.current_output_format("sk-basic") == "mp3_44100_128"
+        # Only that key's plan is affected
+        assert engine.current_output_format("sk-pro") == "pcm_44100"
+    assert (tmp_path / "fallback.wav").read_bytes() == b"mp3-bytes"
+
+    # An ordinary validation error is raised as is and doesn't switch formats
+    client.text_to_speech.side_effect = TTSError("invalid voice settings", status_code=422)
+    with patch('engine._pcm_rejected_plans', set()), patch('engine.TTS_OUTPUT_FORMAT', "pcm_44100"):
+        with pytest.raises(TTSError, match="invalid voice settings"):
+            generate_audio("Hi", "voice", str(tmp_path / "bad.wav"), cache=None, client=client, stream=False)
+        assert client.text_to_speech.call_args.kwargs["output_format"] == "pcm_44100"
+        assert engine.current_output_format() == "pcm_44100"
+
+
+def test_fake_api_server_serves_audio_and_throttles():
+    """Test that the local stand-in server returns real PCM and honest 429s."""
+    from fake_api_server import start_fake_server
+    from tts_client import ElevenLabsClient, TTSError
+
+    server, base_url = start_fake_server(latency=0, jitter=0)
+    try:
+        client = ElevenLabsClient(api_key="fake", base_url=base_url)
+        audio = client.text_to_speech("voice", {"text": "abcd"}, output_format="pcm_16000")
+        # 4 chars * 60 ms at 16 kHz, 2 bytes per sample
+        assert len(audio) == 4 * 60 * 16 * 2
+
+        chat = client.session.post(f"{base_url}/v1/chat/completions", json={"model": "gpt-4o-mini"}).json()
+        assert chat["choices"][0]["message"]["content"].startswith("Anjli:")
+    finally:
+        server.shutdown()
+
+    server, base_url = start_fake_server(latency=0, jitter=0, rate_429=1.0, retry_after=3)
+    try:
+        with pytest.raises(TTSError) as excinfo:
+            ElevenLabsClient(api_key="fake", base_url=base_url).text_to_speech("voice", {"text": "a"})
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.retry_after == 3
+    finally:
+        server.shutdown()
+
+
+def test_render_metrics_records_each_stage(tmp_path):
+    """Test that a render records every pipeline stage and summarizes it for the history."""
+    import json
+    from render_metrics import JsonLogSink, PrometheusSink, RenderMetrics
+
+    script = """
+    Anjli: Line one
+    Hitesh: Line two
+    """
+    log_path = tmp_path / "metrics.jsonl"
+    prometheus = PrometheusSink()
+    metrics = RenderMetrics("render-1", sinks=[JsonLogSink(str(log_path)), prometheus])
+
+    def fake_generate_audio(text, voice_id, filename, metrics=None, **kwargs):
+        metrics.record("tts", 0.01, bytes=100, chars=len(text), cached=False)
+        return filename
+
+    with patch('engine.generate_audio', side_effect=fake_generate_audio), \
+            patch('pydub.AudioSegment.from_mp3', return_value=AudioSegment.silent(duration=100)), \
+            patch('pydub.AudioSegment.export'), \
+            patch('engine.resolve_bg_music', return_value=tmp_path / "bg.mp3"), \
+            patch('engine.load_background', return_value=AudioSegment.silent(duration=50)):
+        generate_radio_show_from_script(script, metrics=metrics)
+
+    summary = metrics.summary()
+    stages = summary["stages"]
+    assert set(stages) == {"parse", "tts", "decode", "concat", "bg_decode", "mix", "export"}
+    assert stages["tts"]["count"] == 2
+    assert stages["tts"]["chars"] == len("Line one") + len("Line two")
+    assert stages["decode"]["count"] == 2
+    assert stages["concat"]["bytes"] > 0
+
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert records[-1]["type"] == "render" and records[-1]["status"] == "ok"
+    assert all(r["render_id"] == "render-1" for r in records)
+
+    text = prometheus.render_text()
+    assert 'radio_render_total{status="ok"} 1' in text
+    assert 'radio_render_stage_seconds_count{stage="tts"} 2' in text
+    assert 'radio_render_stage_chars_total{stage="tts"} 16' in text
+
+    # The unauthenticated endpoint listens on loopback unless told otherwise
+    import urllib.request
+    server = prometheus.serve(0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert b"radio_render_total" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Memory is measured per stage, not as the process's lifetime peak
+    from render_metrics import current_rss_mb
+    if current_rss_mb() is not None:
+        assert all(r["rss_mb"] for r in records if r.get("stage"))
+        alloc_metrics = RenderMetrics("render-2", sinks=[])
+        with alloc_metrics.stage("alloc"):
+            buffer = b"x" * (64 * 1024 * 1024)
+        del buffer
+        with alloc_metrics.stage("idle"):
+            pass
+        alloc_stages = alloc_metrics.summary()["stages"]
+        assert alloc_stages["alloc"]["max_rss_delta_mb"] >= 32
+        assert alloc_stages["idle"]["max_rss_delta_mb"] < 32
+
+
+def test_render_job_queue_runs_jobs_and_recovers_after_restart(tmp_path):
+    """Test that jobs run on a bounded pool, report progress and survive a restart."""
+    import json
+    import threading
+    from engine import ELEVENLABS_API_KEY_DEFAULT
+    from render_jobs import RenderJobQueue, job_secrets, DONE, FAILED, QUEUED
+
+    jobs_file = tmp_path / "jobs.json"
+    release = threading.Event()
+    running = []
+    seen_secrets = []
+
+    def runner(job, progress_callback, secrets):
+        running.append(job["id"])
+        seen_secrets.append(secrets)
+        progress_callback("🔊 Voice 1/4")
+        release.wait(5)
+        if job["script"] == "bad":
+            raise ValueError("No valid dialogue found in script")
+        return {"audio_file": f"{job['id']}.mp3"}
+
+    jobs = RenderJobQueue(jobs_file, workers=1, runner=runner)
+    # As the app submits them: a key of the user's own, and the server default
+    first = jobs.submit("Anjli: Hi", topic="Chai", secrets=job_secrets("sk-secret"))
+    second = jobs.submit("bad", secrets=job_secrets(ELEVENLABS_API_KEY_DEFAULT))
+    for _ in range(100):
+        if jobs.get(first["id"])["progress"] == 0.25:
+            break
+        time.sleep(0.01)
+
+    # One worker: the second job waits its turn
+    assert running == [first["id"]]
+    assert jobs.position(second["id"]) == 1
+    assert "sk-secret" not in jobs_file.read_text()
+
+    release.set()
+    jobs.shutdown()
+    for _ in range(100):
+        if jobs.get(second["id"])["status"] == FAILED:
+            break
+        time.sleep(0.01)
+    assert jobs.get(first["id"])["status"] == DONE
+    assert jobs.get(first["id"])["result"] == {"audio_file": f"{first['id']}.mp3"}
+    assert jobs.get(second["id"])["error"] == "No valid dialogue found in script"
+    assert seen_secrets[0] == {"elevenlabs_api_key": "sk-secret"}
+
+    # Saving the show moves its audio; the persisted job follows it to the library
+    jobs.mark_saved(first["id"], {"id": 7, "audio_file": "library/ab/abcd.mp3"})
+    assert jobs.get(first["id"])["result"]["audio_file"] == "library/ab/abcd.mp3"
+    assert json.loads(jobs_file.read_text())[0]["result"]["show_id"] == 7
+
+    # A job left "running" by a dead process is queued again on startup,
+    # unless it needed API keys that died with the process
+    saved = json.loads(jobs_file.read_text())
+    saved[0].update(status="running", result=None)
+    saved[1].update(status="running", script="Anjli: Hi again", error=None)
+    jobs_file.write_text(json.dumps(saved))
+    restarted = RenderJobQueue(jobs_file, workers=1, runner=runner, autostart=False)
+    assert restarted.get(saved[0]["id"])["status"] == FAILED
+    assert "API keys" in restarted.get(saved[0]["id"])["error"]
+    assert restarted.get(saved[1]["id"])["status"] == QUEUED
+    restarted.start()
+    restarted.shutdown()
+    assert restarted.get(saved[1]["id"])["status"] == DONE
+    assert seen_secrets[-1] == {}
+
+
+def test_renders_use_isolated_workspaces_and_unique_outputs():
+    """Test that each render writes clips to its own workspace, removed afterwards."""
+    from engine import JOBS_PATH
+
+    script = """
+    Anjli: Line one
+    Hitesh: Line two
+    """
+    clip_paths = []
+
+    def fake_generate_audio(text, voice_id, filename, **kwargs):
+        clip_paths.append(Path(filename))
+        Path(filename).write_bytes(b"clip")
+        return filename
+
+    with patch('engine.generate_audio', side_effect=fake_generate_audio), \
+            patch('pydub.AudioSegment.from_mp3', return_value=AudioSegment.silent(duration=100)), \
+            patch('pydub.AudioSegment.export'), \
+            patch('engine.resolve_bg_music', return_value=None):
+        first = generate_radio_show_from_script(script, job_id="job-a")
+        second = generate_radio_show_from_script(script)
+
+    assert first != second
+    assert Path(first).name == "radio_show_job-a.mp3"
+    assert {p.parent for p in clip_paths[:2]} == {JOBS_PATH / "job-a"}
+    assert clip_paths[2].parent != JOBS_PATH / "job-a"
+    assert not any(p.parent.exists() for p in clip_paths)
+
+
+def test_batch_runner_checkpoints_and_resumes(tmp_path):
+    """Test that an interrupted batch resumes from each topic's last finished stage."""
+    import json
+    from batch_render import BatchRunner
+
+    topics = ["Chai", "Mumbai Local"]
+    calls = {"fetch": [], "script": [], "render": [], "job_ids": []}
+
+    def fake_fetch(topic):
+        calls["fetch"].append(topic)
+        return f"{topic} summary"
+
+    def fake_dialogue(client, wiki):
+        calls["script"].append(wiki)
+        return "Anjli: Hi\nHitesh: Hello"
+
+    def fake_render(script, job_id=None, output_file=None, metrics=None):
+        calls["render"].append(Path(output_file).stem)
+        calls["job_ids"].append(job_id)
+        if output_file.stem.endswith("mumbai_local") and len(calls["render"]) <= 2:
+            raise RuntimeError("ElevenLabs down")
+        return str(output_file)
+
+    with patch('batch_render.fetch_wikipedia_summary', side_effect=fake_fetch), \
+            patch('batch_render.generate_dialogue', side_effect=fake_dialogue), \
+            patch('batch_render.generate_radio_show_from_script', side_effect=fake_render):
+        runner = BatchRunner(tmp_path, fetch_workers=2, script_workers=1, render_workers=1, log=lambda msg: None)
+        report = runner.run(topics)
+        assert (report["succeeded"], report["failed"]) == (1, 1)
+        assert json.loads((tmp_path / "report.json").read_text())["failed"] == 1
+
+        report = runner.run(topics)
+
+    assert (report["succeeded"], report["failed"]) == (2, 0)
+    assert report["resumed_from_checkpoint"] == 1
+    # The failed topic only re-ran its render stage
+    assert sorted(calls["fetch"]) == ["Chai", "Mumbai Local"]
+    assert len(calls["script"]) == 2
+    assert calls["render"].count("001_mumbai_local") == 2
+    # Every render gets its own workspace, even when re-running the same topic
+    assert len(set(calls["job_ids"])) == len(calls["job_ids"])
+    assert (tmp_path / "000_chai.txt").read_text().startswith("Anjli: Hello dosto")
+
+
+def test_wikipedia_summaries_and_disambiguations_are_cached(tmp_path):
+    """Test that repeat lookups skip Wikipedia until the entry expires."""
+    import wikipedia
+    from script_gen import fetch_wikipedia_summary
+    from wiki_cache import WikiCache
+
+    cache = WikiCache(tmp_path, ttl_s=60)
+
+    def fake_summary(topic, sentences):
+        if topic == "Mercury":
+            raise wikipedia.exceptions.DisambiguationError("Mercury", ["Mercury (planet)", "Mercury (element)"])
+        return f"{topic} has {sentences} sentences"
+
+    with patch('wikipedia.summary', side_effect=fake_summary) as summary:
+        assert fetch_wikipedia_summary("Mumbai", 5, cache=cache) == "Mumbai has 5 sentences"
+        assert fetch_wikipedia_summary("  mumbai ", 5, cache=cache) == "Mumbai has 5 sentences"
+        fetch_wikipedia_summary("Mumbai", 10, cache=cache)
+        for _ in range(2):
+            with pytest.raises(wikipedia.exceptions.DisambiguationError) as excinfo:
+                fetch_wikipedia_summary("Mercury", 5, cache=cache)
+            assert excinfo.value.options == ["Mercury (planet)", "Mercury (element)"]
+        assert summary.call_count == 3
+
+        # Entries survive a restart, but not their TTL
+        assert WikiCache(tmp_path, ttl_s=60).get("MUMBAI", 5)["summary"] == "Mumbai has 5 sentences"
+        assert WikiCache(tmp_path, ttl_s=0).get("Mumbai", 5) is None
+        assert cache.stats()["hits"] == 2
+
+
+def test_script_cache_reuses_and_cycles_variants(tmp_path):
+    """Test that identical requests hit the cache and regenerating steps through variants first."""
+    from script_cache import ScriptCache
+    from script_gen import generate_dialogue
+
+    cache = ScriptCache(tmp_path, max_variants=2)
+    client = MagicMock()
+    replies = iter(["Anjli: Take one", "Anjli: Take two", "Anjli: Other topic", "Anjli: Take three"])
+
+    def create(**kwargs):
+        response = MagicMock()
+        response.choices[0].message.content = next(replies)
+        return response
+
+    client.chat.completions.create.side_effect = create
+
+    assert generate_dialogue(client, "Chai summary", cache=cache) == "Anjli: Take one"
+    assert generate_dialogue(client, "Chai summary", cache=cache) == "Anjli: Take one"
+    assert generate_dialogue(client, "Chai summary", variant=1, cache=cache) == "Anjli: Take two"
+    assert generate_dialogue(client, "Chai summary", temperature=0.2, cache=cache) == "Anjli: Other topic"
+    assert client.chat.completions.create.call_count == 3
+    # Once every stored take has been shown, regenerating pays for a fresh one that replaces the oldest
+    assert generate_dialogue(client, "Chai summary", variant=2, cache=cache) == "Anjli: Take three"
+    assert client.chat.completions.create.call_count == 4
+    assert generate_dialogue(client, "Chai summary", cache=cache) == "Anjli: Take two"
+    assert generate_dialogue(client, "Chai summary", variant=1, cache=cache) == "Anjli: Take three"
+
+    stats = ScriptCache(tmp_path, max_variants=2).stats()
+    assert stats["entries"] == 2
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 3
+
+
+def test_streamed_script_lines_start_tts_before_the_script_ends():
+    """Test that LLM deltas are split into lines and each is synthesized as it arrives."""
+    import threading
+    from engine import generate_radio_show_from_lines
+    from script_gen import stream_dialogue_lines
+
+    def delta(text):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = text
+        return chunk
+
+    first_line_synthesized = threading.Event()
+
+    def fake_stream(**kwargs):
+        assert kwargs["stream"] is True
+        yield delta("Anjli: Namaste")
+        yield delta(" dosto\nHitesh: Kya")
+        # The first line must reach TTS while the model is still writing
+        assert first_line_synthesized.wait(5)
+        yield delta(" haal hai?\n\nAnjli: Badhiya")
+
+    client = MagicMock()
+    client.chat.completions.create.side_effect = fake_stream
+    synthesized = []
+
+    def fake_generate_audio(text, voice_id, filename, **kwargs):
+        synthesized.append(text)
+        first_line_synthesized.set()
+        return filename
+
+    with patch('engine.generate_audio', side_effect=fake_generate_audio), \
+            patch('pydub.AudioSegment.from_mp3', return_value=AudioSegment.silent(duration=100)), \
+            patch('pydub.AudioSegment.export'), \
+            patch('engine.resolve_bg_music', return_value=None):
+        audio_file, script = generate_radio_show_from_lines(
+            stream_dialogue_lines(client, "Chai summary", cache=None), max_workers=1
+        )
+
+    assert script == "Anjli: Namaste dosto\nHitesh: Kya haal hai?\nAnjli: Badhiya"
+    assert synthesized == ["Namaste dosto", "Kya haal hai?", "Badhiya"]
+    assert audio_file.endswith(".mp3")
+
+
+def test_show_history_sqlite_migrates_json_and_never_reuses_ids(tmp_path):
+    """Test that history moves to SQLite once, keeps IDs unique and survives concurrent writers."""
+    import json
+    import threading
+    import show_history
+
+    legacy = tmp_path / "show_history.json"
+    legacy.write_text(json.dumps([
+        {"id": 1, "topic": "Chai", "script": "Anjli: Hi", "audio_file": "a.mp3", "created_at": "2024-01-01T10:00:00", "metadata": {}},
+        {"id": 2, "topic": "Mumbai", "script": "Hitesh: Hello", "audio_file": "b.mp3", "created_at": "2024-01-02T10:00:00", "metadata": {"pause_duration": 800}},
+    ]))
+
+    with patch.object(show_history, "HISTORY_DB", tmp_path / "history.db"), \
+            patch.object(show_history, "HISTORY_FILE", legacy):
+        assert [s["topic"] for s in show_history.get_all_shows()] == ["Mumbai", "Chai"]
+        assert show_history.get_show(2)["metadata"] == {"pause_duration": 800}
+        assert not legacy.exists()
+
+        assert show_history.delete_show(2)
+        assert not show_history.delete_show(2)
+        # IDs keep increasing after a delete instead of being handed out again
+        assert show_history.add_show("Cricket", "Anjli: Six!", "c.mp3")["id"] == 3
+
+        threads = [threading.Thread(target=show_history.add_show, args=(f"Topic {n}", "Anjli: Hi", None)) for n in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        shows = show_history.get_all_shows()
+        assert len(shows) == 12
+        assert len({s["id"] for s in shows}) == 12
+        assert len(show_history.get_all_shows(limit=5)) == 5
+
+        show_history.clear_history()
+        assert show_history.load_history() == []
+
+    # Add 1, 2, 3, delete 2, add twice: the old scheme gave IDs 1, 3, 3, 4
+    repeated = tmp_path / "repeated.json"
+    repeated.write_text(json.dumps([
+        {"id": 1, "topic": "Chai", "created_at": "2024-01-01T10:00:00"},
+        {"id": 3, "topic": "Cricket", "created_at": "2024-01-03T10:00:00"},
+        {"id": 3, "topic": "Goa", "created_at": "2024-01-04T10:00:00"},
+        {"id": 4, "topic": "Delhi", "created_at": "2024-01-05T10:00:00"},
+    ]))
+    with patch.object(show_history, "HISTORY_DB", tmp_path / "repeated.db"), \
+            patch.object(show_history, "HISTORY_FILE", repeated):
+        shows = {s["topic"]: s["id"] for s in show_history.load_history()}
+        assert shows == {"Chai": 1, "Cricket": 3, "Goa": 5, "Delhi": 4}
+        assert show_history.add_show("Pune", "Anjli: Hi", None)["id"] == 6
+
+
+def test_show_history_pages_newest_first_without_scripts(tmp_path):
+    """Test that the library reads one page at a time and leaves scripts out of listings."""
+    import show_history
+
+    with patch.object(show_history, "HISTORY_DB", tmp_path / "history.db"), \
+            patch.object(show_history, "HISTORY_FILE", tmp_path / "none.json"):
+        for n in range(25):
+            show_history.add_show(f"Topic {n}", f"Anjli: Script {n}", f"{n}.mp3")
+
+        assert show_history.count_shows() == 25
+        first = show_history.get_shows_page(offset=0, limit=10)
+        last = show_history.get_shows_page(offset=20, limit=10)
+        assert [s["topic"] for s in first[:2]] == ["Topic 24", "Topic 23"]
+        assert [s["topic"] for s in last] == [f"Topic {n}" for n in range(4, -1, -1)]
+        assert first[0]["script"] is None and first[0]["audio_file"] == "24.mp3"
+        assert show_history.get_shows_page(0, 1, include_script=True)[0]["script"] == "Anjli: Script 24"
+
+
+def test_show_search_ranks_matches_and_tracks_deletes(tmp_path):
+    """Test that the inverted index ranks topic matches first, handles phrases and forgets deleted shows."""
+    import show_history
+
+    with patch.object(show_history, "HISTORY_DB", tmp_path / "history.db"), \
+            patch.object(show_history, "HISTORY_FILE", tmp_path / "none.json"):
+        chai = show_history.add_show("Chai", "Anjli: Masala chai ka kya kehna!\nHitesh: Cutting chai best hai.", "a.mp3")
+        train = show_history.add_show("Mumbai Local", "Anjli: Local train mein chai bhi milti hai.", "b.mp3")
+        cricket = show_history.add_show("Cricket", "Hitesh: Sachin ka straight drive yaad hai?", "c.mp3")
+
+        results = show_history.search_shows("chai")
+        assert [s["id"] for s in results] == [chai["id"], train["id"]]
+        assert results[0]["script"] is None and "chai" in results[0]["snippet"].lower()
+        assert [s["id"] for s in show_history.search_shows('"straight drive"')] == [cricket["id"]]
+        assert show_history.search_shows('"drive straight"') == []
+        # Plain words next to a phrase are optional, even when no show has them
+        assert [s["id"] for s in show_history.search_shows('football "straight drive"')] == [cricket["id"]]
+        assert [s["id"] for s in show_history.search_shows('mumbai "straight drive"')] == [cricket["id"]]
+        assert show_history.search_shows('chai "googly"') == []
+        assert show_history.search_shows("football") == []
+
+        show_history.delete_show(chai["id"])
+        assert [s["id"] for s in show_history.search_shows("chai")] == [train["id"]]
+        show_history.clear_history()
+        assert show_history.search_shows("train") == []
+
+
+def test_library_store_dedupes_audio_and_collects_garbage(tmp_path):
+    """Test that saved audio is stored once per content and deleted with its last show."""
+    import library_store
+    import show_history
+
+    renders = tmp_path / "renders"
+    renders.mkdir()
+    for name, data in (("a.mp3", b"same audio"), ("b.mp3", b"same audio"), ("c.mp3", b"other audio")):
+        (renders / name).write_bytes(data)
+
+    with patch.object(show_history, "HISTORY_DB", tmp_path / "history.db"), \
+            patch.object(show_history, "HISTORY_FILE", tmp_path / "none.json"), \
+            patch.object(library_store, "LIBRARY_PATH", tmp_path / "library"):
+        first = show_history.add_show("Chai", "Anjli: Hi", str(renders / "a.mp3"))
+        second = show_history.add_show("Chai again", "Anjli: Hi", str(renders / "b.mp3"))
+        third = show_history.add_show("Cricket", "Hitesh: Six", str(renders / "c.mp3"), move_audio=False)
+
+        assert first["audio_file"] == second["audio_file"]
+        assert Path(first["audio_file"]).read_bytes() == b"same audio"
+        assert not (renders / "a.mp3").exists() and not (renders / "b.mp3").exists()
+        assert (renders / "c.mp3").exists()
+        assert show_history.library_usage() == {"files": 2, "bytes": len(b"same audio") + len(b"other audio")}
+
+        # The shared file survives until its last show is deleted
+        show_history.delete_show(first["id"])
+        assert Path(second["audio_file"]).exists()
+        show_history.delete_show(second["id"])
+        assert not Path(second["audio_file"]).exists()
+
+        stray = tmp_path / "library" / "ff" / "leftover.mp3"
+        stray.parent.mkdir(parents=True)
+        stray.write_bytes(b"crash leftover")
+        show_history.clear_history()
+        assert not Path(third["audio_file"]).exists() and not stray.exists()
+        assert show_history.library_usage() == {"files": 0, "bytes": 0}
+
+
+def test_retention_evicts_lru_intermediates_within_budget(tmp_path):
+    """Test that retention frees space oldest-intermediate-first and keeps history audio."""
+    from retention import RetentionManager
+    from tts_cache import ClipCache
+
+    now = time.time()
+    day = 24 * 60 * 60
+
+    def make(relative, size, age_s):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age_s, now - age_s))
+        return path
+
+    old_clip = make("cache/old.clip", 100, 3 * day)
+    new_clip = make("cache/new.clip", 100, 2 * day)
+    render_clip = make("renders/key1/0_Anjli.wav", 100, 1 * day)
+    old_show = make("shows/radio_show_a.mp3", 100, 5 * day)
+    saved_show = make("shows/radio_show_b.mp3", 100, 6 * day)
+    workspace_clip = make("jobs/running/0_Anjli.wav", 100, 60)
+    library_file = make("library/ab/abcd.mp3", 300, 30 * day)
+    expired_upload = make("uploads/music.mp3", 10, 40 * day)
+    clip_cache = ClipCache(tmp_path / "cache")
+    assert clip_cache.stats()["bytes"] == 200
+
+    manager = RetentionManager(
+        audio_path=tmp_path, max_bytes=600, max_age_s=30 * day, min_age_s=60 * 60,
+        protected=lambda: {str(saved_show)}, clip_cache=clip_cache
+    )
+    assert manager.usage()["bytes"] == 910
+    result = manager.sweep(batch_size=1, pause_s=0)
+
+    # The expired upload always goes; then intermediates, least recently used first, until under budget
+    assert not expired_upload.exists()
+    assert not old_clip.exists() and not new_clip.exists()
+    # Clips are evicted through the cache, so its size accounting follows
+    assert clip_cache.stats()["entries"] == 0 and clip_cache.stats()["bytes"] == 0
+    assert not render_clip.parent.exists()
+    assert old_show.exists()
+    # History audio, the library and recent workspaces are never touched
+    assert saved_show.exists() and library_file.exists() and workspace_clip.exists()
+    assert result["deleted"] == 4 and result["freed_bytes"] == 310
+    assert not result["over_budget"]
+
+    usage = manager.usage()
+    assert usage["bytes"] == 600
+    assert usage["categories"]["library"] == {"files": 1, "bytes": 300}
+    assert usage["categories"]["clips"] == {"files": 0, "bytes": 0}
+
+
+def test_audio_server_serves_byte_ranges(tmp_path):
+    """Test that the audio server answers Range requests from disk and stays inside its roots."""
+    import urllib.error
+    import urllib.request
+    from audio_server import AudioServer, RangeNotSatisfiable, audio_url, parse_range
+
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=10-19", 100) == (10, 19)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-5", 100) == (95, 99)
+    assert parse_range("bytes=0-999", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+    library = tmp_path / "library"
+    (library / "ab").mkdir(parents=True)
+    audio = library / "ab" / "abcd.mp3"
+    data = bytes(range(256)) * 40
+    audio.write_bytes(data)
+    (tmp_path / "secret.txt").write_text("not audio")
+
+    server = AudioServer(roots={"library": library}, host="127.0.0.1", port=0).start()
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        url_path = server.url_path(audio)
+        assert url_path == "/library/ab/abcd.mp3"
+        assert server.url_path(tmp_path / "secret.txt") is None
+
+        # Loopback-only by default: remote browsers fall back to Streamlit
+        with patch('audio_server.get_audio_server', return_value=server):
+            assert audio_url(audio, host="localhost:8501") == base.replace("127.0.0.1", "localhost") + url_path
+            assert audio_url(audio, host="radio.example.com:8501") is None
+            with patch('audio_server.AUDIO_SERVER_URL', "https://radio.example.com/audio/"):
+                assert audio_url(audio, host="radio.example.com") == "https://radio.example.com/audio" + url_path
+
+        request = urllib.request.Request(base + url_path, headers={"Range": "bytes=1000-1999"})
+        with urllib.request.urlopen(request) as response:
+            assert response.status == 206
+            assert response.headers["Content-Range"] == f"bytes 1000-1999/{len(data)}"
+            assert response.read() == data[1000:2000]
+
+        with urllib.request.urlopen(base + url_path + "?download=My%20Show.mp3") as response:
+            assert response.status == 200
+            assert response.headers["Accept-Ranges"] == "bytes"
+            assert 'filename="My_Show.mp3"' in response.headers["Content-Disposition"]
+            assert response.read() == data
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(urllib.request.Request(base + url_path, headers={"Range": f"bytes={len(data)}-"}))
+        assert error.value.code == 416
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(base + "/library/..%2Fsecret.txt")
+        assert error.value.code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,138 @@
+"""
+TTS Clip Cache
+Content-addressed on-disk cache for synthesized speech clips
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_DIR = Path(__file__).parent / "Audios" / "cache"
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "500")) * 1024 * 1024
+
+
+def clip_key(
+    voice_id: str,
+    model_id: str,
+    text: str,
+    voice_settings: Optional[Dict] = None,
+    output_format: Optional[str] = None,
+) -> str:
+    """Hash everything that changes the synthesized audio into a cache key."""
+    payload = json.dumps(
+        {
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "text": text,
+            "voice_settings": voice_settings or {},
+            "output_format": output_format,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ClipCache:
+    """Size-capped clip store with least-recently-used eviction.
+
+    Clips are stored as `<key>.clip` files. The LRU order is rebuilt from file
+    modification times on startup, and hits touch the file so the order
+    survives restarts. Safe to share between threads.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for path in self.cache_dir.glob("*.clip"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.clip"
+
+    def get(self, key: str, dest: str) -> bool:
+        """Copy the cached clip for key to dest. Returns False on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            path = self._path(key)
+            try:
+                shutil.copyfile(path, dest)
+                os.utime(path)
+            except OSError:
+                # File vanished underneath us; forget it and treat as a miss
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def put(self, key: str, src: str):
+        """Store a copy of src under key, evicting old clips to stay under the cap."""
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        shutil.copyfile(src, tmp_path)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def discard(self, key: str) -> bool:
+        """Remove the clip for key. Returns False if there was no file to remove."""
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            try:
+                self._path(key).unlink()
+            except OSError:
+                return False
+            return True
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,158 @@
+"""
+ElevenLabs TTS Client
+Reusable HTTP client with a keep-alive connection pool
+"""
+import os
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class TTSError(Exception):
+    """Non-200 response from the TTS API.
+
+    Attributes:
+        status_code: HTTP status of the response
+        retry_after: Seconds the server asked us to wait, if it said so
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, r: requests.Response) -> "TTSError":
+        return cls(r.text, status_code=r.status_code, retry_after=parse_retry_after(r.headers.get("Retry-After")))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ElevenLabsClient:
+    """Thin ElevenLabs client that keeps its connections open between calls.
+
+    One instance is safe to share between threads and across renders, so
+    every clip after the first skips the TCP and TLS handshake.
+
+    Args:
+        api_key: Default API key (can be overridden per call)
+        base_url: API root, e.g. a local stand-in server
+        pool_size: Max keep-alive connections held open to the API
+        timeout: (connect, read) timeout in seconds
+        retries: Retries for connection errors (429/5xx are left to TTSScheduler)
+        backoff_factor: Exponential backoff base between retries, in seconds
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = ELEVENLABS_BASE_URL,
+        pool_size: int = 10,
+        timeout: Tuple[float, float] = (5, 60),
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status=0,
+            respect_retry_after_header=False,
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _headers(self, api_key: Optional[str]) -> Dict:
+        return {
+            "xi-api-key": api_key or self.api_key,
+            "Content-Type": "application/json"
+        }
+
+    def _params(self, output_format: Optional[str]) -> Dict:
+        return {"output_format": output_format} if output_format else {}
+
+    def text_to_speech(
+        self,
+        voice_id: str,
+        payload: Dict,
+        api_key: Optional[str] = None,
+        output_format: Optional[str] = None,
+    ) -> bytes:
+        """Synthesize payload["text"] with voice_id and return the audio bytes.
+
+        output_format is passed through to the API (e.g. "mp3_44100_128", "pcm_44100").
+        """
+        url = f"{self.base_url}/v1/text-to-speech/{voice_id}"
+        r = self.session.post(
+            url, json=payload, headers=self._headers(api_key),
+            params=self._params(output_format), timeout=self.timeout
+        )
+        if r.status_code != 200:
+            raise TTSError.from_response(r)
+        return r.content
+
+    def stream_text_to_speech(
+        self,
+        voice_id: str,
+        payload: Dict,
+        out: BinaryIO,
+        api_key: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        output_format: Optional[str] = None,
+    ) -> int:
+        """Synthesize via the streaming endpoint, writing chunks to out as they arrive.
+
+        Only one chunk is held in memory at a time. Returns the number of bytes written.
+        """
+        url = f"{self.base_url}/v1/text-to-speech/{voice_id}/stream"
+        written = 0
+        with self.session.post(
+            url, json=payload, headers=self._headers(api_key),
+            params=self._params(output_format), timeout=self.timeout, stream=True
+        ) as r:
+            if r.status_code != 200:
+                raise TTSError.from_response(r)
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    out.write(chunk)
+                    written += len(chunk)
+        return written
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,194 @@
+"""
+TTS Scheduler
+Rate-limit-aware retries and adaptive concurrency for ElevenLabs requests
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+from tts_client import TTSError
+
+TTS_RATE_LIMIT_RPS = float(os.getenv("TTS_RATE_LIMIT_RPS", "5"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "8"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Network failures worth another attempt. ChunkedEncodingError is how a
+# connection dropped partway through a streamed body surfaces.
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` saved up.
+
+    `pause` blocks every caller until a deadline, which is how a server's
+    Retry-After is applied to all renders at once.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for the next `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class TTSScheduler:
+    """Runs TTS calls under a shared rate limit with retries and adaptive concurrency.
+
+    - A token bucket caps the request rate across every render in the process.
+    - 429 and 5xx responses, timeouts and dropped connections are retried
+      with jittered exponential backoff, or after the server's Retry-After.
+    - The concurrency limit grows by about one per window of successful
+      requests and shrinks when latency per unit of cost (e.g. per character)
+      inflates well above the best seen. Throttling halves it.
+
+    Args:
+        rate: Sustained requests per second
+        burst: Requests allowed back to back after an idle period
+        max_concurrency: Upper bound for requests in flight
+        initial_concurrency: Starting limit (default: max_concurrency)
+        min_concurrency: Lower bound the limit never drops below
+        max_retries: Retries per call before giving up
+        base_backoff: First backoff delay in seconds (doubles per attempt)
+        max_backoff: Cap for backoff and Retry-After delays in seconds
+        latency_tolerance: Latency over best-seen ratio treated as overload
+    """
+
+    def __init__(
+        self,
+        rate: float = TTS_RATE_LIMIT_RPS,
+        burst: Optional[float] = None,
+        max_concurrency: int = TTS_MAX_CONCURRENCY,
+        initial_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        latency_tolerance: float = 2.0,
+    ):
+        self.bucket = TokenBucket(rate, burst or max(1.0, rate * 2))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = float(initial_concurrency or max_concurrency)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._min_latency = None
+        self._latency_ewma = None
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def call(self, fn: Callable, cost: float = 1.0):
+        """Run fn() under the scheduler, retrying transient failures.
+
+        `cost` scales the expected latency of the call (e.g. the character
+        count of the text), so long and short lines compare fairly.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            try:
+                self.bucket.acquire()
+                started = time.monotonic()
+                result = fn()
+            except TTSError as e:
+                if e.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                if e.status_code == 429:
+                    self._on_throttled(e.retry_after)
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._on_success((time.monotonic() - started) / max(cost, 1e-9))
+                return result
+            finally:
+                self._release_slot()
+
+            with self._cond:
+                self.retries += 1
+            time.sleep(min(delay, self.max_backoff))
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform over [0, base * 2^attempt]
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _acquire_slot(self):
+        with self._cond:
+            while self._in_flight >= self.concurrency_limit:
+                self._cond.wait()
+            self._in_flight += 1
+            self.calls += 1
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self, latency: float):
+        with self._cond:
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+            if self._latency_ewma is None:
+                self._latency_ewma = latency
+            else:
+                self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+
+            if self._latency_ewma > self._min_latency * self.latency_tolerance:
+                # Requests are queueing server-side; back off gently
+                self._limit = max(self.min_concurrency, self._limit * 0.9)
+            else:
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _on_throttled(self, retry_after: Optional[float]):
+        with self._cond:
+            self.throttled += 1
+            self._limit = max(self.min_concurrency, self._limit / 2)
+        if retry_after:
+            self.bucket.pause(min(retry_after, self.max_backoff))
+
+    def stats(self) -> Dict:
+        """Return counters and the current adaptive limit."""
+        with self._cond:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "in_flight": self._in_flight,
+                "concurrency_limit": self.concurrency_limit,
+                "latency_ewma": self._latency_ewma,
+            }
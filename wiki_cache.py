@@ -0,0 +1,145 @@
+"""
+Wikipedia Cache
+On-disk cache of Wikipedia summaries and disambiguation results
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+WIKI_CACHE_DIR = Path(__file__).parent / "cache" / "wikipedia"
+WIKI_CACHE_TTL_S = float(os.getenv("WIKI_CACHE_TTL_HOURS", "168")) * 60 * 60
+WIKI_CACHE_MAX_BYTES = int(os.getenv("WIKI_CACHE_MAX_MB", "50")) * 1024 * 1024
+
+SUMMARY = "summary"
+DISAMBIGUATION = "disambiguation"
+
+
+def normalize_topic(topic: str) -> str:
+    """Case- and whitespace-insensitive form of a topic, so "  Mumbai " and "mumbai" share an entry."""
+    return re.sub(r"\s+", " ", topic).strip().casefold()
+
+
+def wiki_key(topic: str, sentences: int) -> str:
+    """Cache key for a topic's summary at a given length."""
+    payload = json.dumps({"topic": normalize_topic(topic), "sentences": sentences}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class WikiCache:
+    """TTL- and size-capped store of Wikipedia lookups.
+
+    Entries are `<key>.json` files holding either a summary or the options
+    of a disambiguation page. Expired entries count as misses; the least
+    recently used entries are evicted to stay under max_bytes. Safe to share
+    between threads.
+
+    Args:
+        cache_dir: Directory for entry files
+        ttl_s: Seconds an entry stays fresh
+        max_bytes: Total size cap for all entries
+    """
+
+    def __init__(self, cache_dir: Path = WIKI_CACHE_DIR, ttl_s: float = WIKI_CACHE_TTL_S, max_bytes: int = WIKI_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _drop(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def get(self, topic: str, sentences: int) -> Optional[Dict]:
+        """Return the fresh entry for (topic, sentences), or None on a miss.
+
+        Entries have a "kind" of "summary" (with "summary") or
+        "disambiguation" (with "title" and "options").
+        """
+        key = wiki_key(topic, sentences)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            if time.time() - entry["fetched_at"] > self.ttl_s:
+                self._drop(key)
+                self.misses += 1
+                return None
+            os.utime(self._path(key))
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put_summary(self, topic: str, sentences: int, summary: str):
+        """Store a fetched summary."""
+        self._put(topic, sentences, {"kind": SUMMARY, "summary": summary})
+
+    def put_disambiguation(self, topic: str, sentences: int, title: str, options: List[str]):
+        """Store the options of a disambiguation page, so the next lookup fails fast."""
+        self._put(topic, sentences, {"kind": DISAMBIGUATION, "title": title, "options": list(options)})
+
+    def _put(self, topic: str, sentences: int, entry: Dict):
+        key = wiki_key(topic, sentences)
+        entry = {"topic": topic, "sentences": sentences, "fetched_at": time.time(), **entry}
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }